@@ -1,4 +1,5 @@
-from auth.credential.credential import new, parse, Credential
+from auth.credential.credential import new, parse, try_new, try_parse, \
+    Credential, Result
 
 """
 This module offers an abstraction of a credential, i.e. something that
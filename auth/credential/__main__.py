@@ -0,0 +1,35 @@
+"""
+Command line interface.
+
+Usage: python -m auth.credential serve [--socket PATH] [--field NAME] SOURCE
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.sidecar import DEFAULT_SOCKET, serve
+import argparse
+
+
+def main():
+    """ Run the requested command. """
+    parser = argparse.ArgumentParser(prog="python -m auth.credential")
+    commands = parser.add_subparsers(dest="command")
+    command = commands.add_parser("serve", help="serve credentials to the "
+                                  "local processes over a Unix socket")
+    command.add_argument("--socket", default=DEFAULT_SOCKET,
+                         help="path of the socket (default: %(default)s)")
+    command.add_argument("--field", default="key",
+                         help="key field of the JSON lines "
+                         "(default: %(default)s)")
+    command.add_argument("source", help="credential store or text file")
+    args = parser.parse_args()
+    if args.command != "serve":
+        parser.error("missing command")
+    try:
+        serve(args.source, args.socket, args.field)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
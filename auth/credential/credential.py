@@ -63,7 +63,7 @@ using JSON) and "preparators" that can transform credentials into
 ready-to-use data for well known targets.
 
 Different authentication schemes (aka credential types) are supported.
-This package currently supports *none*, *plain* and *x509* but
+This package currently supports *none*, *plain*, *x509* and *hmac* but
 others can be added by providing the supporting code in a separate module.
 
 For a given scheme, a credential is represented by an object with a
@@ -107,10 +107,56 @@ Here is for instance how it could end up using JSON::
 
 The same information could be stored in a configuration file.
 
+Fingerprint
+===========
+
+The fingerprint of a credential is an HMAC-SHA256 digest of its scheme
+and sorted attributes. It identifies the credential without exposing
+its secrets. By default, the key is random and the fingerprints are
+only stable within a process: to share them across processes, set the
+same secret key in the AUTH_CREDENTIAL_FINGERPRINT_KEY environment
+variable of all of them. Frozen credentials compute it only once and
+use it for hashing and comparisons, so they can be used as dict keys
+or set members::
+
+  cred = credential.parse("plain name=system pass=manager").freeze()
+  seen = set([cred])
+
+Secret files
+============
+
+Instead of being given inline, secrets can be read from files: the
+*passfile* attribute gives the path of the file holding the *pass*
+attribute::
+
+  plain name=system passfile=/run/secrets/system
+
+The file is only read when a preparator needs the secret, see
+:py:meth:`Credential.resolve`. Its content is then cached and read
+again only if the file gets modified.
+
+Non-raising functions
+=====================
+
+parse(), new() and check() raise InvalidCredential on invalid input.
+When invalid input is common, try_parse(), try_new() and validate()
+perform the same checks but return a Result object instead: it is true
+on success and otherwise carries an error code and reason::
+
+  result = credential.try_parse(string)
+  if result:
+      cred = result.credential
+  else:
+      print("%s: %s" % (result.code, result.reason))
+
 Copyright (C) CERN 2013-2021
 """
 
-from auth.credential.error import InvalidCredential
+from auth.credential.error import InvalidCredential, \
+    SYNTAX, DUPLICATE, SCHEME, MISSING, UNEXPECTED, VALUE, CONFLICT
+import hashlib
+import hmac
+import os
 import re
 import sys
 try:
@@ -125,62 +171,226 @@ SEP_CHARS = re.compile(_SEP_CHARS)
 _VAL_CHARS = r'a-zA-Z0-9/\-\+\_\~\.\:'
 _ID_VAL = r'^(%s)=([%s\%%]*)$' % (_ID_RE, _VAL_CHARS)
 ID_VAL = re.compile(_ID_VAL)
-
-
-def parse(string):
+# shared caches: they are only read on the hot paths and the writes
+# store idempotent values so they need no lock
+_SECRETS = dict()
+_SCHEMES = dict()
+# errors of the unsupported schemes, cleared when full
+_SCHEME_ERRORS = dict()
+SCHEME_ERRORS_SIZE = 1024
+# random by default so that fingerprints cannot be brute-forced offline
+if os.environ.get("AUTH_CREDENTIAL_FINGERPRINT_KEY"):
+    FINGERPRINT_KEY = \
+        os.environ["AUTH_CREDENTIAL_FINGERPRINT_KEY"].encode("utf-8")
+else:
+    FINGERPRINT_KEY = os.urandom(32)
+
+
+def read_secret(path):
     """
-    Parse a string containing authentication information
-    and return a dictionary.
+    Return the secret held in the given file, without its trailing
+    newline. The content is cached until the file gets modified.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = _SECRETS.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with open(path, "r") as handle:
+            secret = handle.read()
+    except (IOError, OSError) as err:
+        raise InvalidCredential("cannot read secret file %s: %s"
+                                % (path, err.strerror))
+    if secret.endswith("\n"):
+        secret = secret[:-1]
+        if secret.endswith("\r"):
+            secret = secret[:-1]
+    _SECRETS[path] = (signature, secret)
+    return secret
+
+
+def _parse(string):
+    """
+    Parse a string containing authentication information and return
+    the corresponding options or an error as (code, reason).
     """
     string = string.strip()
     if not string:
-        return new(scheme='none')
+        return ({'scheme': 'none'}, None)
     auth = dict()
     tokens = SEP_CHARS.split(string)
     if len(tokens) == 0:
-        raise InvalidCredential("invalid authentication string: %s" % string)
+        return (None, (SYNTAX, "invalid authentication string: %s" % string))
     if ID_RE.match(tokens[0]):
         auth['scheme'] = tokens[0]
         tokens.remove(tokens[0])
-    format = re.compile(ID_VAL)
     for token in tokens:
-        key_value = format.match(token)
+        key_value = ID_VAL.match(token)
         if not key_value:
-            raise InvalidCredential("invalid authentication key=value: %s"
-                                    % token)
+            return (None, (SYNTAX, "invalid authentication key=value: %s"
+                           % token))
         if key_value.group(1) in auth:
-            raise InvalidCredential("duplicate authentication key: %s"
-                                    % key_value.group(1))
+            return (None, (DUPLICATE, "duplicate authentication key: %s"
+                           % key_value.group(1)))
         else:
             auth[key_value.group(1)] = unquote(key_value.group(2))
-    return new(**auth)
+    return (auth, None)
 
 
-def new(**option):
+def _scheme(option):
     """
-    Return a Credential object according to the option passed and
-    the given scheme.
+    Return the Credential sub-class handling the scheme of the given
+    options or an error as (code, reason).
     """
     atype = option.get("scheme", "non")
-    if atype == "none":
-        atype = "non"
+    if not isinstance(atype, str):
+        return (None, (SCHEME, "credential type not supported: %s"
+                       % (atype, )))
+    klass = _SCHEMES.get(atype)
+    if klass is not None:
+        return (klass, None)
+    error = _SCHEME_ERRORS.get(atype)
+    if error is not None:
+        return (None, error)
+    name = "non" if atype == "none" else atype
     try:
-        __import__("auth.credential.modules.%s" % (atype))
+        __import__("auth.credential.modules.%s" % (name))
     except SyntaxError:
-        raise SyntaxError("error importing credential type: %s" % atype)
+        raise SyntaxError("error importing credential type: %s" % name)
     except ImportError:
-        raise InvalidCredential("credential type not supported: %s" % atype)
-    try:
-        module = sys.modules["auth.credential.modules.%s" % (atype)]
-        return getattr(module, atype.capitalize())(**option)
-    except KeyError:
-        pass
-    raise InvalidCredential("credential type not valid: %s" % atype)
+        return _scheme_error(atype, "credential type not supported: %s"
+                             % name)
+    module = sys.modules.get("auth.credential.modules.%s" % (name))
+    klass = getattr(module, name.capitalize(), None)
+    if klass is None:
+        return _scheme_error(atype, "credential type not valid: %s" % name)
+    _SCHEMES[atype] = klass
+    return (klass, None)
+
+
+def _scheme_error(atype, reason):
+    """ Remember and return the error of an unsupported scheme. """
+    if len(_SCHEME_ERRORS) >= SCHEME_ERRORS_SIZE:
+        _SCHEME_ERRORS.clear()
+    error = _SCHEME_ERRORS[atype] = (SCHEME, reason)
+    return (None, error)
+
+
+def _check(keys, option, changed=None):
+    """
+    Check the given options (or only the changed ones) against the given
+    scheme keys and return None or an error as (code, reason).
+    """
+    if changed is None:
+        changed = option
+        names = keys
+    else:
+        names = [key for key in changed if key in keys]
+    for key in names:
+        value = keys[key]
+        alternative = value.get("alternative", None)
+        if key not in option:
+            if not (value.get("optional", False) or alternative in option):
+                return (MISSING, "attribute missing: %s" % key)
+            continue
+        if alternative in option:
+            return (CONFLICT, "conflicting attributes: %s, %s"
+                    % (key, alternative))
+        match = value.get('match', None)
+        if match is not None and option[key] != match:
+            return (VALUE, "invalid value for: %s" % key)
+    for key in changed:
+        if key not in keys:
+            return (UNEXPECTED, "attribute not expected: %s" % key)
+    return None
+
+
+def try_parse(string):
+    """
+    Parse a string containing authentication information and return a
+    Result, without raising InvalidCredential.
+    """
+    (auth, error) = _parse(string)
+    if error is not None:
+        return Result(None, *error)
+    return try_new(**auth)
+
+
+def try_new(**option):
+    """
+    Return a Result holding a Credential object according to the option
+    passed and the given scheme, without raising InvalidCredential.
+    """
+    (klass, error) = _scheme(option)
+    if error is None:
+        if 'scheme' in klass._keys and 'scheme' not in option:
+            option['scheme'] = klass._keys['scheme']['match']
+        error = _check(klass._keys, option)
+    if error is not None:
+        return Result(None, *error)
+    cred = klass.__new__(klass)
+    cred.__dict__.update(option)
+    return Result(cred)
+
+
+def parse(string):
+    """
+    Parse a string containing authentication information
+    and return a dictionary.
+    """
+    return try_parse(string).unwrap()
+
+
+def new(**option):
+    """
+    Return a Credential object according to the option passed and
+    the given scheme.
+    """
+    return try_new(**option).unwrap()
+
+
+class Result(object):
+    """
+    Outcome of the non-raising functions: it is true if the operation
+    succeeded, in which case credential holds the resulting Credential,
+    otherwise code tells the kind of error (see auth.credential.error)
+    and reason gives the message that InvalidCredential would carry.
+    """
+    __slots__ = ('credential', 'code', 'reason')
+
+    def __init__(self, credential, code=None, reason=None):
+        """ Result constructor """
+        self.credential = credential
+        self.code = code
+        self.reason = reason
+
+    def __bool__(self):
+        """ Return True if the operation succeeded. """
+        return self.code is None
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        """ Return string representation of the object. """
+        if self.code is None:
+            return "Result(%r)" % (self.credential, )
+        return "Result(%s: %s)" % (self.code, self.reason)
+
+    def unwrap(self):
+        """ Return the credential or raise InvalidCredential. """
+        if self.code is not None:
+            raise InvalidCredential(self.reason)
+        return self.credential
 
 
 class Credential(object):
+    # the attributes live in __dict__, the internal state in slots
+    __slots__ = ('__dict__', '__weakref__', '_frozen', '_fingerprint',
+                 '_prepared')
     _keys = []
     _preparator = None
+    # targets whose output only depends on the given attributes
+    _prepare_keys = dict()
 
     def __init__(self, **option):
         """ Credential constructor """
@@ -188,17 +398,42 @@ class Credential(object):
             option = dict()
         if 'scheme' in self._keys and 'scheme' not in option:
             option['scheme'] = self._keys['scheme']['match']
-        for key, value in self._keys.items():
-            optional = value.get("optional", False)
-            if (not optional) and key not in option:
-                raise InvalidCredential("attribute missing: %s" % key)
-            match = value.get('match', None)
-            if match is not None and option[key] != match:
-                raise InvalidCredential("invalid value for: %s" % key)
-        for key, value in option.items():
-            if key not in self._keys:
-                raise InvalidCredential("attribute not expected: %s" % key)
-            self.__dict__[key] = value
+        error = _check(self._keys, option)
+        if error is not None:
+            raise InvalidCredential(error[1])
+        self.__dict__.update(option)
+
+    def __setattr__(self, name, value):
+        """ Set an attribute, unless the credential is frozen. """
+        if getattr(self, '_frozen', False):
+            raise InvalidCredential("credential is immutable")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        """ Delete an attribute, unless the credential is frozen. """
+        if getattr(self, '_frozen', False):
+            raise InvalidCredential("credential is immutable")
+        object.__delattr__(self, name)
+
+    def freeze(self):
+        """ Make the credential immutable and return it. """
+        object.__setattr__(self, '_frozen', True)
+        return self
+
+    def is_frozen(self):
+        """ Return True if the credential is immutable. """
+        return getattr(self, '_frozen', False)
+
+    def __getstate__(self):
+        """ Return the state to copy or pickle, without the caches. """
+        return (self.__dict__, getattr(self, '_frozen', False))
+
+    def __setstate__(self, state):
+        """ Restore the state of a copied or unpickled credential. """
+        (attrs, frozen) = state
+        self.__dict__.update(attrs)
+        if frozen:
+            object.__setattr__(self, '_frozen', True)
 
     def __contains__(self, item):
         """ Return True if item is present. """
@@ -208,8 +443,23 @@ class Credential(object):
         """ Return item from attributes. """
         return self.__dict__[item]
 
+    def resolve(self, item):
+        """
+        Return the value of a secret attribute, reading it from the file
+        given by the corresponding "file" attribute (e.g. passfile for
+        pass) if needed. Return None if neither is present.
+        """
+        value = self.__dict__.get(item)
+        if value is None:
+            path = self.__dict__.get(item + "file")
+            if path is not None:
+                value = read_secret(path)
+        return value
+
     def dict(self):
         """ Return a dict representation of the credential. """
+        if getattr(self, '_frozen', False):
+            return dict(self.__dict__)
         return self.__dict__
 
     def __repr__(self):
@@ -230,33 +480,127 @@ class Credential(object):
             partial.append("%s=%s" % (key, quote(value, _VAL_CHARS)))
         return ' '.join(partial)
 
+    def validate(self):
+        """
+        Check if the given authentication is valid and return a Result,
+        without raising InvalidCredential.
+        """
+        error = _check(self._keys, self.__dict__)
+        if error is not None:
+            return Result(None, *error)
+        return Result(self)
+
     def check(self):
         """ Check if the given authentication is valid. """
-        for key, value in self.__dict__.items():
-            if key not in self._keys:
-                raise InvalidCredential("attribute not expected: %s" % key)
-        for key, value in self._keys.items():
-            optional = value.get("optional", False)
-            if (not optional) and key not in self.__dict__:
-                raise InvalidCredential("attribute missing: %s" % key)
-            match = value.get('match', None)
-            if match is not None and self.__dict__[key] != match:
-                raise InvalidCredential("invalid value for: %s" % key)
+        self.validate().unwrap()
         # so far so good
         return True
 
+    def fingerprint(self):
+        """
+        Return a keyed digest of the scheme and attributes, as a string.
+        It is computed only once for frozen credentials.
+        """
+        fingerprint = getattr(self, '_fingerprint', None)
+        if fingerprint is not None:
+            return fingerprint
+        attrs = self.__dict__
+        partial = [attrs.get('scheme', '')]
+        for key in sorted(attrs):
+            if key == 'scheme':
+                continue
+            partial.append("%s=%s" % (key, quote(attrs[key], _VAL_CHARS)))
+        fingerprint = hmac.new(FINGERPRINT_KEY,
+                               ' '.join(partial).encode("utf-8"),
+                               hashlib.sha256).hexdigest()
+        if getattr(self, '_frozen', False):
+            object.__setattr__(self, '_fingerprint', fingerprint)
+        return fingerprint
+
+    def __hash__(self):
+        """ Return the hash of the credential, which must be frozen. """
+        if not getattr(self, '_frozen', False):
+            raise TypeError("unhashable type: mutable credential")
+        return int(self.fingerprint()[:16], 16)
+
     def __eq__(self, other):
         """ Check if the credential is equal to the given one. """
+        if self is other:
+            return True
         if not isinstance(other, Credential):
-            return False
+            # let proxies such as RemoteCredential answer
+            return NotImplemented
+        mine = getattr(self, '_fingerprint', None)
+        if mine is not None:
+            theirs = getattr(other, '_fingerprint', None)
+            if theirs is not None:
+                return mine == theirs
         return self.__dict__ == other.__dict__
 
+    def __ne__(self, other):
+        """ Check if the credential is different from the given one. """
+        return not self == other
+
     def equals(self, other):
         """ Check if the credential is equal to the given one. """
-        return self.__eq__(other)
+        return self == other
+
+    def replace(self, **changes):
+        """
+        Return a new credential with the given attributes changed, or
+        removed if set to None. Only the changed attributes are checked
+        and the cached data not depending on them is kept.
+        """
+        option = dict(self.__dict__)
+        for key, value in changes.items():
+            if value is None:
+                option.pop(key, None)
+            else:
+                option[key] = value
+        error = _check(self._keys, option, changes)
+        if error is not None:
+            raise InvalidCredential(error[1])
+        cred = self.__class__.__new__(self.__class__)
+        cred.__dict__.update(option)
+        if not getattr(self, '_frozen', False):
+            return cred
+        changed = [key for key in changes
+                   if option.get(key) != self.__dict__.get(key)]
+        fingerprint = getattr(self, '_fingerprint', None)
+        if fingerprint is not None and not changed:
+            object.__setattr__(cred, '_fingerprint', fingerprint)
+        prepared = getattr(self, '_prepared', None)
+        if prepared:
+            kept = dict()
+            for target, output in prepared.items():
+                for key in self._prepare_keys[target]:
+                    if key in changed or key + "file" in changed:
+                        break
+                else:
+                    kept[target] = output
+            object.__setattr__(cred, '_prepared', kept)
+        return cred.freeze()
 
     def prepare(self, target):
-        """ Generic preparator. """
+        """
+        Generic preparator. For frozen credentials, the output of the
+        targets listed in _prepare_keys is computed only once, unless it
+        depends on secrets read from files.
+        """
         if target not in self._preparator:
             raise InvalidCredential("target not supported")
-        return getattr(self, self._preparator[target])()
+        keys = self._prepare_keys.get(target)
+        if keys is None or not getattr(self, '_frozen', False):
+            return getattr(self, self._preparator[target])()
+        prepared = getattr(self, '_prepared', None)
+        if prepared is None:
+            prepared = dict()
+            object.__setattr__(self, '_prepared', prepared)
+        output = prepared.get(target)
+        if output is None:
+            output = getattr(self, self._preparator[target])()
+            for key in keys:
+                if key + "file" in self.__dict__:
+                    return output
+            prepared[target] = output
+        return output
@@ -1,9 +1,20 @@
 """
 Errors used in the module.
 
+The non-raising functions (try_parse, try_new and validate) report the
+same errors using the following codes instead.
+
 Copyright (C) CERN 2013-2021
 """
 
+SYNTAX = "syntax"
+DUPLICATE = "duplicate"
+SCHEME = "scheme"
+MISSING = "missing"
+UNEXPECTED = "unexpected"
+VALUE = "value"
+CONFLICT = "conflict"
+
 
 class InvalidCredential(Exception):
     """
@@ -0,0 +1,101 @@
+"""
+:py:meth:`InternPool` - interning of identical credentials
+
+Synopsis
+========
+
+Example::
+
+  from auth.credential.intern import InternPool
+
+  pool = InternPool()
+  cred1 = pool.parse("plain name=system pass=manager")
+  cred2 = pool.parse("plain name=system pass=manager")
+  assert cred1 is cred2
+  print("%d bytes saved" % pool.stats()['saved'])
+
+Description
+===========
+
+Applications holding many equal credentials (for instance one per
+connection) can use an interning pool to share a single canonical
+instance between all of them. Since it is shared, the canonical
+instance is frozen, see :py:meth:`Credential.freeze`.
+
+The pool only holds weak references to the canonical instances so
+the credentials which are not used anymore are reclaimed as usual.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.credential import new, parse
+import sys
+import threading
+import weakref
+
+
+def _sizeof(cred, canonical):
+    """
+    Return the memory used by the credential that is not shared with
+    the canonical one.
+    """
+    size = sys.getsizeof(cred) + sys.getsizeof(cred.__dict__)
+    for key, value in cred.__dict__.items():
+        if value is not canonical.__dict__.get(key):
+            size += sys.getsizeof(value)
+    return size
+
+
+class InternPool(object):
+    """
+    Pool of canonical immutable credentials.
+    """
+
+    def __init__(self):
+        """ InternPool constructor """
+        self._pool = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._saved = 0
+
+    def __len__(self):
+        """ Return the number of live canonical credentials. """
+        return len(self._pool)
+
+    def intern(self, cred):
+        """
+        Return the canonical credential equal to the given one. If there
+        is none yet, the given credential is frozen and becomes the
+        canonical one.
+        """
+        key = (cred.__class__, tuple(sorted(cred.__dict__.items())))
+        with self._lock:
+            canonical = self._pool.get(key)
+            if canonical is None:
+                self._misses += 1
+                self._pool[key] = cred.freeze()
+                return cred
+            self._hits += 1
+            if canonical is not cred:
+                self._saved += _sizeof(cred, canonical)
+            return canonical
+
+    def new(self, **option):
+        """ Same as new() but return an interned credential. """
+        return self.intern(new(**option))
+
+    def parse(self, string):
+        """ Same as parse() but return an interned credential. """
+        return self.intern(parse(string))
+
+    def stats(self):
+        """
+        Return a dict with the number of live canonical credentials, of
+        hits and misses and an estimation of the bytes saved.
+        """
+        with self._lock:
+            return {'size': len(self._pool),
+                    'hits': self._hits,
+                    'misses': self._misses,
+                    'saved': self._saved}
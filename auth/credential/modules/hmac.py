@@ -0,0 +1,187 @@
+"""
+HMAC Credential
+===============
+
+:py:meth:`Hmac` - abstraction of an *hmac* credential
+
+Description
+-----------
+
+This helper module for Credential implements an *hmac* credential,
+that is an access key and a secret key used to sign requests with the
+AWS Signature Version 4 scheme, as understood by S3-compatible object
+stores.
+
+It supports the following attributes:
+
+access
+    the access key identifier
+
+secret
+    the associated secret key
+
+region
+    the region the requests are sent to (e.g. us-east-1)
+
+service
+    the service the requests are sent to (e.g. s3)
+
+The *HTTP.SigV4* preparator returns a signing function, see
+:py:meth:`Hmac.sign`. Many requests can be signed at once with
+:py:meth:`Hmac.sign_many`.
+
+The derived signing key only depends on the secret, the day, the region
+and the service so it is cached and shared by all the signatures made
+during the same day. The cache holds up to SIGNING_KEYS_SIZE keys, which
+can be raised for pools of many accounts: when it is full, the keys of
+the past days are dropped first.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential import Credential
+import hashlib
+import hmac
+import threading
+import time
+try:
+    from urllib.parse import quote, unquote, urlsplit, parse_qsl
+except ImportError:
+    from urllib import quote, unquote
+    from urlparse import urlsplit, parse_qsl
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+SIGNING_KEYS_SIZE = 1024
+# derived signing keys, read without lock
+_SIGNING_KEYS = dict()
+_SIGNING_KEYS_LOCK = threading.Lock()
+
+
+def _hmac(key, msg):
+    """ Return the raw HMAC-SHA256 of the given message. """
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _signing_key(secret, datestamp, region, service):
+    """ Return the signing key for the given day, region and service. """
+    cache_key = (secret, datestamp, region, service)
+    key = _SIGNING_KEYS.get(cache_key)
+    if key is not None:
+        return key
+    key = _hmac(("AWS4" + secret).encode("utf-8"), datestamp)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    key = _hmac(key, "aws4_request")
+    if len(_SIGNING_KEYS) >= SIGNING_KEYS_SIZE:
+        _evict(datestamp)
+    _SIGNING_KEYS[cache_key] = key
+    return key
+
+
+def _evict(datestamp):
+    """ Make room in the signing keys cache, keeping today's keys. """
+    with _SIGNING_KEYS_LOCK:
+        for cache_key in list(_SIGNING_KEYS):
+            if cache_key[1] != datestamp:
+                _SIGNING_KEYS.pop(cache_key, None)
+        if len(_SIGNING_KEYS) >= SIGNING_KEYS_SIZE:
+            # too many keys for today: simply start again
+            _SIGNING_KEYS.clear()
+
+
+def _canonical_query(query):
+    """ Return the canonical form of an URL query string. """
+    params = [(quote(key, "-_.~"), quote(value, "-_.~"))
+              for key, value in parse_qsl(query, keep_blank_values=True)]
+    return "&".join(["%s=%s" % param for param in sorted(params)])
+
+
+def _payload_hash(payload):
+    """ Return the hash of the payload as expected in the signature. """
+    if payload is None:
+        return UNSIGNED_PAYLOAD
+    if not isinstance(payload, bytes):
+        payload = payload.encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class Hmac(Credential):
+    _keys = {'scheme': {'match': 'hmac'},
+             'access': dict(),
+             'secret': dict(),
+             'region': dict(),
+             'service': dict(), }
+    _preparator = dict()
+
+    def signing_key(self, datestamp):
+        """ Return the (cached) signing key for the given YYYYMMDD day. """
+        return _signing_key(self.__dict__['secret'], datestamp,
+                            self.__dict__['region'],
+                            self.__dict__['service'])
+
+    def _sign(self, key, amzdate, method, url, headers, payload):
+        """ Sign one request using the given derived signing key. """
+        datestamp = amzdate[:8]
+        parts = urlsplit(url)
+        result = {'x-amz-date': amzdate}
+        payload_hash = _payload_hash(payload)
+        if self.__dict__['service'] == 's3':
+            result['x-amz-content-sha256'] = payload_hash
+        signed = dict()
+        for name, value in (headers or dict()).items():
+            signed[name.lower()] = " ".join(str(value).split())
+        signed.setdefault('host', parts.netloc)
+        signed.update(result)
+        names = sorted(signed)
+        canonical = "\n".join([
+            method.upper(),
+            quote(unquote(parts.path or "/"), "/-_.~"),
+            _canonical_query(parts.query),
+            "".join(["%s:%s\n" % (name, signed[name]) for name in names]),
+            ";".join(names),
+            payload_hash])
+        scope = "%s/%s/%s/aws4_request" % (datestamp,
+                                           self.__dict__['region'],
+                                           self.__dict__['service'])
+        to_sign = "\n".join([
+            ALGORITHM, amzdate, scope,
+            hashlib.sha256(canonical.encode("utf-8")).hexdigest()])
+        signature = hmac.new(key, to_sign.encode("utf-8"),
+                             hashlib.sha256).hexdigest()
+        result['Authorization'] = \
+            "%s Credential=%s/%s, SignedHeaders=%s, Signature=%s" % \
+            (ALGORITHM, self.__dict__['access'], scope, ";".join(names),
+             signature)
+        return result
+
+    def sign(self, method, url, headers=None, payload=b"", timestamp=None):
+        """
+        Sign an HTTP request and return the headers to add to it.
+
+        The payload may be None to send it unsigned and the timestamp is
+        an UTC datetime defaulting to now.
+        """
+        return self.sign_many([(method, url, headers, payload)],
+                              timestamp)[0]
+
+    def sign_many(self, requests, timestamp=None):
+        """
+        Sign many (method, url, headers, payload) requests and return
+        the list of headers to add to them.
+
+        All the requests share the same timestamp so the signing key is
+        derived only once.
+        """
+        if timestamp is None:
+            amzdate = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        else:
+            amzdate = timestamp.strftime("%Y%m%dT%H%M%SZ")
+        key = self.signing_key(amzdate[:8])
+        return [self._sign(key, amzdate, method, url, headers, payload)
+                for (method, url, headers, payload) in requests]
+
+    def _prepare_http_sigv4(self):
+        """ Return a function signing HTTP requests """
+        return self.sign
+    _preparator["HTTP.SigV4"] = "_prepare_http_sigv4"
@@ -18,6 +18,9 @@ name
 pass
     the associated (clear text) password
 
+passfile
+    the path of the file holding the password, instead of pass
+
 Copyright (C) CERN 2013-2021
 """
 
@@ -28,12 +31,14 @@ import base64
 class Plain(Credential):
     _keys = {'scheme': {'match': 'plain'},
              'name': dict(),
-             'pass': dict(), }
+             'pass': {'alternative': 'passfile'},
+             'passfile': {'alternative': 'pass'}, }
     _preparator = dict()
+    _prepare_keys = {"HTTP.Basic": ("name", "pass")}
 
     def _prepare_http_basic(self):
         """ Return the Authorization header for an HTTP Request """
-        tmp = "%s:%s" % (self.__dict__['name'], self.__dict__['pass'])
+        tmp = "%s:%s" % (self.__dict__['name'], self.resolve('pass'))
         return "Basic %s" % base64.b64encode(tmp.encode()).decode()
     _preparator["HTTP.Basic"] = "_prepare_http_basic"
 
@@ -42,7 +47,8 @@ class Plain(Credential):
         params = dict()
         if self.__dict__.get('name'):
             params['user'] = self.__dict__.get('name')
-        if self.__dict__.get('pass'):
-            params['passcode'] = self.__dict__.get('pass')
+        password = self.resolve('pass')
+        if password:
+            params['passcode'] = password
         return params
     _preparator["stomppy.plain"] = "_prepare_stomppy_plain"
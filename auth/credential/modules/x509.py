@@ -21,20 +21,195 @@ key
 pass
     the pass-phrase protecting the private key (optional)
 
+passfile
+    the path of the file holding the pass-phrase, instead of pass
+    (optional)
+
 ca
     the path of the directory containing trusted certificates (optional)
 
+ca_file
+    the path of the file containing trusted certificates (optional)
+
+The certificates found in the *ca* directory are indexed by subject
+once and kept in memory, see :py:meth:`X509.ca_index`. The index only
+re-reads the files which have been added or modified since the last
+scan, so it is cheap to use it for every connection. It is used by the
+*ssl.context* preparator which returns a ready-to-use ssl.SSLContext.
+
 Copyright (C) CERN 2013-2021
 """
 
 from auth.credential import Credential
+from auth.credential.error import InvalidCredential
+import base64
+import hashlib
+import os
+import re
+import ssl
+import threading
+
+_PEM_RE = re.compile(b"-----BEGIN CERTIFICATE-----(.+?)"
+                     b"-----END CERTIFICATE-----", re.DOTALL)
+_INDEXES = dict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def _der_element(data, pos):
+    """ Return the (tag, start, end) of the DER element at pos. """
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    if pos + length > len(data):
+        raise ValueError("truncated DER element")
+    return (tag, pos, pos + length)
+
+
+def _der_subject(der):
+    """ Return the DER encoded subject of a DER encoded certificate. """
+    (_, pos, _) = _der_element(der, 0)
+    (_, pos, end) = _der_element(der, pos)
+    fields = list()
+    while pos < end and len(fields) < 6:
+        (tag, _, next_pos) = _der_element(der, pos)
+        fields.append((tag, pos, next_pos))
+        pos = next_pos
+    if fields and fields[0][0] == 0xa0:
+        # skip the explicit version
+        fields.pop(0)
+    if len(fields) < 5:
+        raise ValueError("invalid certificate")
+    # serialNumber, signature, issuer, validity, subject
+    (_, start, end) = fields[4]
+    return der[start:end]
+
+
+def _read_certificates(path):
+    """ Return the list of DER encoded certificates held in a file. """
+    with open(path, "rb") as handle:
+        data = handle.read()
+    blocks = _PEM_RE.findall(data)
+    if blocks:
+        return [base64.b64decode(b"".join(block.split()))
+                for block in blocks]
+    return [data]
+
+
+def subject_hash(subject):
+    """ Return the hash used to index a DER encoded subject. """
+    return hashlib.sha1(subject).hexdigest()
+
+
+class CAIndex(object):
+    """
+    In-memory index of the certificates found in a directory, by
+    subject hash.
+    """
+
+    def __init__(self, path):
+        """ CAIndex constructor """
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = dict()
+        # index and cadata, replaced together so that readers need no lock
+        self._state = (dict(), b"")
+        self._mtime = None
+
+    def __len__(self):
+        """ Return the number of distinct indexed certificates. """
+        return sum([len(certs) for certs in self._state[0].values()])
+
+    def _mtime_ns(self):
+        """ Return the modification time of the directory. """
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except (IOError, OSError) as err:
+            raise InvalidCredential("cannot read ca directory %s: %s"
+                                    % (self.path, err.strerror))
+
+    def refresh(self):
+        """
+        Scan the directory and (re-)read only the files which have been
+        added or modified since the last scan. The files which cannot be
+        read are skipped.
+        """
+        with self._lock:
+            mtime = self._mtime_ns()
+            seen = dict()
+            try:
+                entries = list(os.scandir(self.path))
+            except (IOError, OSError) as err:
+                raise InvalidCredential("cannot read ca directory %s: %s"
+                                        % (self.path, err.strerror))
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        seen[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except (IOError, OSError):
+                    continue
+            changed = False
+            for path in list(self._files):
+                if seen.get(path) != self._files[path][0]:
+                    del self._files[path]
+                    changed = True
+            for path, signature in seen.items():
+                if path in self._files:
+                    continue
+                try:
+                    ders = _read_certificates(path)
+                except (IOError, OSError):
+                    # unreadable, try again at the next scan
+                    continue
+                certs = list()
+                for der in ders:
+                    try:
+                        certs.append((subject_hash(_der_subject(der)), der))
+                    except (IndexError, ValueError):
+                        # not a certificate
+                        continue
+                self._files[path] = (signature, certs)
+                changed = True
+            if changed:
+                # hashed directories hold several links to each file
+                index = dict()
+                for path in sorted(self._files):
+                    for (key, der) in self._files[path][1]:
+                        certs = index.setdefault(key, list())
+                        if der not in certs:
+                            certs.append(der)
+                cadata = b"".join([der for key in sorted(index)
+                                   for der in index[key]])
+                self._state = (index, cadata)
+            self._mtime = mtime
+
+    def update(self):
+        """ Refresh the index if files have been added or removed. """
+        if self._mtime != self._mtime_ns():
+            self.refresh()
+
+    def find(self, subject):
+        """ Return the DER encoded certificates with the given subject. """
+        return list(self._state[0].get(subject_hash(subject), list()))
+
+    def cadata(self):
+        """
+        Return all the indexed certificates, as DER data suitable for
+        ssl.SSLContext.load_verify_locations().
+        """
+        return self._state[1]
 
 
 class X509(Credential):
     _keys = {'scheme': {'match': 'x509'},
              'cert': {'optional': True},
              'key': {'optional': True},
-             'pass': {'optional': True},
+             'pass': {'optional': True, 'alternative': 'passfile'},
+             'passfile': {'optional': True, 'alternative': 'pass'},
              'ca': {'optional': True},
              'ca_file': {'optional': True}}
     _preparator = dict()
@@ -50,3 +225,34 @@ class X509(Credential):
             params['ssl_ca_certs'] = self.__dict__.get('ca')
         return params
     _preparator["stomppy.x509"] = "_prepare_stomppy"
+
+    def ca_index(self):
+        """ Return the up-to-date CAIndex of the ca directory. """
+        path = os.path.realpath(self.__dict__['ca'])
+        if not os.path.isdir(path):
+            raise InvalidCredential("ca is not a directory: %s"
+                                    % self.__dict__['ca'])
+        index = _INDEXES.get(path)
+        if index is None:
+            with _INDEXES_LOCK:
+                index = _INDEXES.setdefault(path, CAIndex(path))
+        index.update()
+        return index
+
+    def _prepare_ssl_context(self):
+        """ Return an ssl.SSLContext to authenticate TLS connections """
+        cadata = None
+        if self.__dict__.get('ca'):
+            cadata = self.ca_index().cadata()
+            if not cadata:
+                # never fall back to the default trusted certificates
+                raise InvalidCredential("no certificate found in ca: %s"
+                                        % self.__dict__['ca'])
+        context = ssl.create_default_context(
+            cafile=self.__dict__.get('ca_file'), cadata=cadata)
+        if self.__dict__.get('cert'):
+            context.load_cert_chain(self.__dict__['cert'],
+                                    self.__dict__.get('key'),
+                                    self.resolve('pass'))
+        return context
+    _preparator["ssl.context"] = "_prepare_ssl_context"
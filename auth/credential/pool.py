@@ -0,0 +1,234 @@
+"""
+:py:meth:`CredentialPool` - rotation of credentials
+
+Synopsis
+========
+
+Example::
+
+  import auth.credential as credential
+  from auth.credential.pool import CredentialPool, LEAST_IN_USE
+
+  pool = CredentialPool([credential.parse(string) for string in strings],
+                        policy=LEAST_IN_USE)
+
+  # get ready-to-use data from the next credential
+  params = pool.prepare('stomppy.plain')
+
+  # or hold a credential while it is in use and report failures
+  with pool.lease() as cred:
+      conn = stomp.Connection(host_and_ports, **cred.prepare('stomppy.plain'))
+      try:
+          conn.connect()
+      except stomp.exception.ConnectFailedException:
+          pool.report_failure(cred)
+
+Description
+===========
+
+A credential pool spreads the load over several accounts, for instance
+to stay below per-account rate or connection limits. The credentials
+are handed out according to a policy:
+
+round-robin
+    each credential in turn
+
+least-in-use
+    the credential with the fewest leases in progress
+
+weighted
+    each credential in proportion to its weight
+
+The credentials must be distinct objects since they identify their
+counters: to give an account more turns, use the weighted policy rather
+than repeating it.
+
+A credential with too many consecutive failures is ejected from the
+rotation for some time. If all the credentials are ejected, they are
+all used again.
+
+The rotation uses an atomic counter and the per-credential counters are
+protected by striped locks so concurrent threads rarely contend. The
+weighted policy interleaves the credentials with the smooth weighted
+round-robin algorithm, which keeps one counter per credential and costs
+O(n) per pick under a lock.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.error import InvalidCredential
+import contextlib
+import itertools
+import threading
+import time
+
+ROUND_ROBIN = "round-robin"
+LEAST_IN_USE = "least-in-use"
+WEIGHTED = "weighted"
+POLICIES = (ROUND_ROBIN, LEAST_IN_USE, WEIGHTED)
+
+
+class CredentialPool(object):
+    """
+    Pool of credentials handed out according to the given policy.
+    """
+
+    def __init__(self, creds, policy=ROUND_ROBIN, weights=None,
+                 max_failures=3, eject_time=30.0, stripes=16):
+        """ CredentialPool constructor """
+        self._creds = list(creds)
+        if not self._creds:
+            raise InvalidCredential("empty credential pool")
+        if policy not in POLICIES:
+            raise InvalidCredential("pool policy not supported: %s" % policy)
+        size = len(self._creds)
+        self._policy = policy
+        self._position = dict([(id(cred), index)
+                               for index, cred in enumerate(self._creds)])
+        if len(self._position) != size:
+            # the counters are found from the objects
+            raise InvalidCredential("duplicate credential object in pool")
+        if policy == WEIGHTED:
+            if weights is None or len(weights) != size:
+                raise InvalidCredential("invalid pool weights")
+            for weight in weights:
+                if not isinstance(weight, (int, float)) or \
+                        isinstance(weight, bool) or not weight > 0:
+                    raise InvalidCredential("invalid pool weight: %r"
+                                            % (weight, ))
+            self._weights = list(weights)
+            self._current = [0] * size
+            self._weighted_lock = threading.Lock()
+        self._counter = itertools.count()
+        self._in_use = [0] * size
+        self._failures = [0] * size
+        self._ejected = [0.0] * size
+        self._max_failures = max_failures
+        self._eject_time = eject_time
+        self._locks = [threading.Lock() for _ in range(min(size, stripes))]
+
+    def __len__(self):
+        """ Return the number of credentials. """
+        return len(self._creds)
+
+    def _index(self, cred):
+        """ Return the index of the given credential. """
+        try:
+            return self._position[id(cred)]
+        except KeyError:
+            raise InvalidCredential("credential not in pool: %s"
+                                    % cred.scheme)
+
+    def _lock(self, index):
+        """ Return the lock protecting the counters of the given index. """
+        return self._locks[index % len(self._locks)]
+
+    def _pick(self):
+        """ Return the index of the next credential to use. """
+        now = time.monotonic()
+        if self._policy == WEIGHTED:
+            return self._pick_weighted(now)
+        ejected = self._ejected
+        size = len(self._creds)
+        start = next(self._counter)
+        if self._policy == LEAST_IN_USE:
+            in_use = self._in_use
+            best = None
+            for offset in range(size):
+                index = (start + offset) % size
+                if ejected[index] > now:
+                    continue
+                if best is None or in_use[index] < in_use[best]:
+                    best = index
+                    if not in_use[index]:
+                        break
+            if best is not None:
+                return best
+        else:
+            for offset in range(size):
+                index = (start + offset) % size
+                if ejected[index] <= now:
+                    return index
+        # all ejected
+        return start % size
+
+    def _pick_weighted(self, now):
+        """
+        Return the index of the next credential to use according to the
+        weights, with the smooth weighted round-robin algorithm.
+        """
+        ejected = self._ejected
+        weights = self._weights
+        candidates = [index for index in range(len(weights))
+                      if ejected[index] <= now]
+        if not candidates:
+            # all ejected
+            candidates = range(len(weights))
+        with self._weighted_lock:
+            current = self._current
+            total = 0
+            best = None
+            for index in candidates:
+                current[index] += weights[index]
+                total += weights[index]
+                if best is None or current[index] > current[best]:
+                    best = index
+            current[best] -= total
+        return best
+
+    def get(self):
+        """ Return the next credential, without leasing it. """
+        return self._creds[self._pick()]
+
+    def prepare(self, target):
+        """ Return the prepared target of the next credential. """
+        return self._creds[self._pick()].prepare(target)
+
+    def acquire(self):
+        """ Lease the next credential, it must be released afterwards. """
+        index = self._pick()
+        with self._lock(index):
+            self._in_use[index] += 1
+        return self._creds[index]
+
+    def release(self, cred):
+        """ Release a leased credential. """
+        index = self._index(cred)
+        with self._lock(index):
+            self._in_use[index] -= 1
+
+    @contextlib.contextmanager
+    def lease(self):
+        """ Lease the next credential for the duration of a with block. """
+        cred = self.acquire()
+        try:
+            yield cred
+        finally:
+            self.release(cred)
+
+    def in_use(self, cred):
+        """ Return the number of leases in progress of a credential. """
+        return self._in_use[self._index(cred)]
+
+    def report_failure(self, cred):
+        """
+        Report an authentication failure of the credential, which gets
+        ejected for a while after too many consecutive failures.
+        """
+        index = self._index(cred)
+        with self._lock(index):
+            self._failures[index] += 1
+            if self._failures[index] >= self._max_failures:
+                self._failures[index] = 0
+                self._ejected[index] = time.monotonic() + self._eject_time
+
+    def report_success(self, cred):
+        """ Report a successful authentication of the credential. """
+        index = self._index(cred)
+        if self._failures[index]:
+            with self._lock(index):
+                self._failures[index] = 0
+
+    def is_ejected(self, cred):
+        """ Return True if the credential is currently ejected. """
+        return self._ejected[self._index(cred)] > time.monotonic()
@@ -0,0 +1,398 @@
+"""
+:py:meth:`RemoteCredential` - credentials served by a local sidecar
+
+Synopsis
+========
+
+Start the sidecar once per host, with a file holding the credentials
+in the format understood by :py:meth:`auth.credential.store.convert`
+(or a store built by it)::
+
+  python -m auth.credential serve --socket /run/credential.sock creds.txt
+
+Then, in the processes::
+
+  from auth.credential.sidecar import RemoteCredential
+
+  cred = RemoteCredential("joe", "/run/credential.sock")
+  headers = {"Authorization": cred.prepare('HTTP.Basic')}
+
+Description
+===========
+
+Instead of having every process of a host parse the same credentials
+and compute the same prepared data, a sidecar server loads them once
+and serves them over a Unix domain socket, which only the owner of the
+server can use.
+
+The protocol is made of messages holding a JSON object, preceded by
+their length as a 4 bytes big-endian integer. Each request gets one
+response on the same connection:
+
+{"op": "get", "key": KEY}
+    returns the structured representation of the credential as
+    {"ok": true, "credential": {...}}
+
+{"op": "prepare", "key": KEY, "target": TARGET}
+    returns the prepared data as {"ok": true, "result": ...}, or
+    {"ok": false, "local": true, ...} if it cannot be represented in
+    JSON, in which case the client prepares the target itself
+
+Failed requests get {"ok": false, "error": REASON}.
+
+:py:meth:`RemoteCredential` can be used like a Credential. The responses
+are cached by the client connection shared by all the threads of a
+process so that each process queries the sidecar only once per
+credential and target. The requests time out after DEFAULT_TIMEOUT
+seconds so that a hung sidecar cannot block its clients.
+
+When starting, the server replaces a stale socket left by a previous
+sidecar but refuses to use a path that is not a socket or on which
+another sidecar is still listening.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.credential import new
+from auth.credential.error import InvalidCredential
+from auth.credential.store import MAGIC, Store, read_entries
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+
+DEFAULT_SOCKET = os.environ.get("AUTH_CREDENTIAL_SOCKET",
+                                "/run/auth.credential.sock")
+DEFAULT_TIMEOUT = 5.0
+_LENGTH = struct.Struct(">I")
+MAX_MESSAGE = 1 << 20
+
+
+def _receive(sock):
+    """ Read a message, return None on end of file. """
+    header = b""
+    while len(header) < _LENGTH.size:
+        chunk = sock.recv(_LENGTH.size - len(header))
+        if not chunk:
+            if header:
+                raise InvalidCredential("truncated sidecar message")
+            return None
+        header += chunk
+    (length, ) = _LENGTH.unpack(header)
+    if length > MAX_MESSAGE:
+        raise InvalidCredential("sidecar message too large: %d" % length)
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(min(length - len(data), 65536))
+        if not chunk:
+            raise InvalidCredential("truncated sidecar message")
+        data += chunk
+    return json.loads(data.decode("utf-8"))
+
+
+def _send(sock, message):
+    """ Write a message. """
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def load(path, field="key"):
+    """
+    Load the credentials to serve from a store or a text file, whose
+    JSON lines use the given field as key, and return them as a dict of
+    frozen credentials.
+    """
+    with open(path, "rb") as handle:
+        magic = handle.read(len(MAGIC))
+    if magic == MAGIC:
+        with Store(path) as store:
+            return dict([(key, store[key].freeze())
+                         for key in store.keys()])
+    return dict([(key, cred.freeze())
+                 for (key, cred) in read_entries(path, field)])
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """ Handle the requests of a sidecar connection. """
+
+    def handle(self):
+        """ Answer requests until the client disconnects. """
+        while True:
+            try:
+                request = _receive(self.request)
+            except (InvalidCredential, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                response = self.server.answer(request)
+            except InvalidCredential as err:
+                response = {"ok": False, "error": str(err)}
+            except Exception as err:
+                # never let a request kill the connection thread
+                response = {"ok": False, "error": "%s: %s"
+                            % (err.__class__.__name__, err)}
+            try:
+                _send(self.request, response)
+            except TypeError:
+                # the client prepares such targets itself
+                _send(self.request, {"ok": False, "local": True,
+                                     "error": "target not serializable"})
+
+
+def _remove_stale(path):
+    """
+    Remove the socket left at the given path by a sidecar that is not
+    running anymore.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise InvalidCredential("not a socket: %s" % path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        os.unlink(path)
+        return
+    finally:
+        sock.close()
+    raise InvalidCredential("sidecar already running: %s" % path)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Sidecar server answering requests about the given credentials.
+    """
+    daemon_threads = True
+
+    def __init__(self, path, creds):
+        """ Server constructor """
+        self.creds = creds
+        _remove_stale(path)
+        umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def answer(self, request):
+        """ Return the response to the given request. """
+        if not isinstance(request, dict):
+            raise InvalidCredential("invalid sidecar request")
+        for name in ("op", "key"):
+            if not isinstance(request.get(name), str):
+                raise InvalidCredential("invalid sidecar request %s: %r"
+                                        % (name, request.get(name)))
+        cred = self.creds.get(request["key"])
+        if cred is None:
+            raise InvalidCredential("unknown credential: %s"
+                                    % request["key"])
+        operation = request["op"]
+        if operation == "get":
+            return {"ok": True, "credential": cred.dict()}
+        if operation == "prepare":
+            target = request.get("target")
+            if not isinstance(target, str):
+                raise InvalidCredential("invalid sidecar request target: %r"
+                                        % (target, ))
+            return {"ok": True, "result": cred.prepare(target)}
+        raise InvalidCredential("invalid sidecar operation: %s" % operation)
+
+    def server_close(self):
+        """ Close the server and remove its socket. """
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def serve(source, path=DEFAULT_SOCKET, field="key"):
+    """ Serve the credentials found in source on the given socket. """
+    server = Server(path, load(source, field))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class SidecarClient(object):
+    """
+    Connection to a sidecar, shared by the threads of a process, with
+    the cache of its responses.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=DEFAULT_TIMEOUT):
+        """ SidecarClient constructor """
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        # cached responses, read without lock
+        self._creds = dict()
+        self._prepared = dict()
+
+    def close(self):
+        """ Close the connection. """
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def _reset(self):
+        """ Close the connection, which may be out of sync. """
+        self._sock.close()
+        self._sock = None
+
+    def _exchange(self, request):
+        """ Send a request and return the response, successful or not. """
+        with self._lock:
+            for attempt in (1, 2):
+                if self._sock is None:
+                    self._sock = socket.socket(socket.AF_UNIX,
+                                               socket.SOCK_STREAM)
+                    self._sock.settimeout(self.timeout)
+                    try:
+                        self._sock.connect(self.path)
+                    except (IOError, OSError) as err:
+                        self._reset()
+                        raise InvalidCredential("cannot connect to sidecar "
+                                                "%s: %s" % (self.path, err))
+                try:
+                    _send(self._sock, request)
+                    response = _receive(self._sock)
+                except socket.timeout:
+                    self._reset()
+                    raise InvalidCredential("sidecar timeout: %s"
+                                            % self.path)
+                except (IOError, OSError):
+                    response = None
+                except (InvalidCredential, ValueError) as err:
+                    self._reset()
+                    raise InvalidCredential("invalid sidecar response: %s"
+                                            % err)
+                if isinstance(response, dict):
+                    return response
+                if response is not None:
+                    self._reset()
+                    raise InvalidCredential("invalid sidecar response")
+                # the sidecar may have been restarted, try again once
+                self._reset()
+            raise InvalidCredential("sidecar connection lost: %s"
+                                    % self.path)
+
+    def request(self, **request):
+        """ Send a request and return the successful response. """
+        response = self._exchange(request)
+        if not response.get("ok"):
+            raise InvalidCredential(response.get("error"))
+        return response
+
+    def credential(self, key):
+        """ Return the (cached) Credential object of the given key. """
+        cred = self._creds.get(key)
+        if cred is None:
+            response = self.request(op="get", key=key)
+            cred = new(**response["credential"]).freeze()
+            self._creds[key] = cred
+        return cred
+
+    def prepare(self, key, target):
+        """
+        Return the (cached) prepared data of the given key and target.
+        The targets which cannot be represented in JSON are prepared
+        locally.
+        """
+        try:
+            return self._prepared[(key, target)]
+        except KeyError:
+            pass
+        response = self._exchange(dict(op="prepare", key=key, target=target))
+        if response.get("ok"):
+            result = response["result"]
+        elif response.get("local"):
+            result = self.credential(key).prepare(target)
+        else:
+            raise InvalidCredential(response.get("error"))
+        self._prepared[(key, target)] = result
+        return result
+
+    def forget(self, key):
+        """ Forget the cached responses about the given key. """
+        self._creds.pop(key, None)
+        for cache_key in list(self._prepared):
+            if cache_key[0] == key:
+                self._prepared.pop(cache_key, None)
+
+
+_CLIENTS = dict()
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _client(path):
+    """ Return the shared client of the given socket. """
+    client = _CLIENTS.get(path)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.setdefault(path, SidecarClient(path))
+    return client
+
+
+class RemoteCredential(object):
+    """
+    Proxy to a credential served by a sidecar, with the same interface
+    as Credential.
+    """
+
+    def __init__(self, key, path=DEFAULT_SOCKET):
+        """ RemoteCredential constructor """
+        self._key = key
+        self._client = _client(path)
+
+    def credential(self):
+        """ Return the (cached) Credential object. """
+        return self._client.credential(self._key)
+
+    def clear(self):
+        """ Forget the responses cached by the process. """
+        self._client.forget(self._key)
+
+    def prepare(self, target):
+        """ Return the (cached) prepared data of the given target. """
+        return self._client.prepare(self._key, target)
+
+    def __getattr__(self, name):
+        """ Return the attributes of the credential. """
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.credential(), name)
+
+    def __contains__(self, item):
+        """ Return True if item is present. """
+        return item in self.credential()
+
+    def __getitem__(self, item):
+        """ Return item from attributes. """
+        return self.credential()[item]
+
+    def __eq__(self, other):
+        """ Check if the credential is equal to the given one. """
+        if isinstance(other, RemoteCredential):
+            other = other.credential()
+        return self.credential() == other
+
+    def __ne__(self, other):
+        """ Check if the credential is different from the given one. """
+        return not self == other
+
+    def __hash__(self):
+        """ Return the hash of the credential. """
+        return hash(self.credential())
+
+    def __repr__(self):
+        """ Return string representation of the object. """
+        return self.credential().string()
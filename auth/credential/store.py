@@ -0,0 +1,220 @@
+"""
+:py:meth:`Store` - indexed on-disk credential store
+
+Synopsis
+========
+
+Example::
+
+  from auth.credential.store import Store, convert
+
+  # build the store once from a file with one credential per line
+  convert("credentials.txt", "credentials.db")
+
+  # then look credentials up by key
+  with Store("credentials.db") as store:
+      cred = store["joe"]
+
+Description
+===========
+
+This module handles large collections of credentials stored on disk in
+a binary format made of the string representation of each credential
+and of an index sorted by key. The file is memory mapped so opening it
+takes the same time whatever its size and a lookup only decodes the
+requested credential.
+
+Stores are built from (key, credential) pairs with :py:meth:`build` or
+converted from text files with :py:meth:`convert`. The text files hold
+one credential per line, either as its key followed by its string
+representation::
+
+  joe plain name=joe pass=sekret
+
+or as its structured representation in JSON with an additional key
+field::
+
+  {"key":"joe","scheme":"plain","name":"joe","pass":"sekret"}
+
+Empty lines and lines starting with # are ignored.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.credential import new, parse
+from auth.credential.error import InvalidCredential
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"AUTHCRED"
+VERSION = 1
+# magic, version, count, index offset
+_HEADER = struct.Struct("<8sIIQ")
+# key offset, key length, record offset, record length
+_ENTRY = struct.Struct("<QIQI")
+
+
+def build(path, entries):
+    """
+    Build a store at the given path from (key, credential) pairs. The
+    file is replaced atomically.
+    """
+    records = sorted([(key.encode("utf-8"), cred.string().encode("utf-8"))
+                      for (key, cred) in entries])
+    for index in range(1, len(records)):
+        if records[index][0] == records[index - 1][0]:
+            raise InvalidCredential("duplicate store key: %s"
+                                    % records[index][0].decode("utf-8"))
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(temporary, "wb") as handle:
+            offset = _HEADER.size
+            index = list()
+            handle.write(b"\0" * _HEADER.size)
+            for (key, record) in records:
+                handle.write(key)
+                handle.write(record)
+                index.append(_ENTRY.pack(offset, len(key),
+                                         offset + len(key), len(record)))
+                offset += len(key) + len(record)
+            handle.write(b"".join(index))
+            handle.seek(0)
+            handle.write(_HEADER.pack(MAGIC, VERSION, len(records), offset))
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+
+
+def read_entries(source, field):
+    """ Yield the (key, credential) pairs defined in a text file. """
+    with open(source, "r") as handle:
+        for (number, line) in enumerate(handle, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                if line.startswith("{"):
+                    option = json.loads(line)
+                    key = option.pop(field)
+                    if not isinstance(key, str):
+                        raise ValueError("invalid key: %r" % (key, ))
+                    for name, value in option.items():
+                        if not isinstance(value, str):
+                            raise ValueError("invalid value for %s: %r"
+                                             % (name, value))
+                    cred = new(**option)
+                else:
+                    tokens = line.split(None, 1)
+                    if len(tokens) < 2:
+                        raise ValueError("missing credential after key")
+                    (key, cred) = (tokens[0], parse(tokens[1]))
+            except (InvalidCredential, KeyError, ValueError) as err:
+                raise InvalidCredential("%s:%d: invalid credential: %s"
+                                        % (source, number, err))
+            yield (key, cred)
+
+
+def convert(source, path, field="key"):
+    """
+    Build a store at the given path from a text file holding string or
+    JSON representations of credentials, the latter using the given
+    field as key.
+    """
+    build(path, read_entries(source, field))
+
+
+class Store(object):
+    """
+    Read-only memory mapped credential store.
+    """
+
+    def __init__(self, path):
+        """ Store constructor """
+        self.path = path
+        with open(path, "rb") as handle:
+            try:
+                self._mmap = mmap.mmap(handle.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                raise InvalidCredential("invalid credential store: %s"
+                                        % path)
+        try:
+            (magic, version, count, offset) = \
+                _HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION or \
+                offset + count * _ENTRY.size > len(self._mmap):
+            self._mmap.close()
+            raise InvalidCredential("invalid credential store: %s" % path)
+        self._count = count
+        self._offset = offset
+
+    def __enter__(self):
+        """ Enter a with block. """
+        return self
+
+    def __exit__(self, *exc):
+        """ Close the store when leaving a with block. """
+        self.close()
+
+    def close(self):
+        """ Close the store. """
+        self._mmap.close()
+
+    def __len__(self):
+        """ Return the number of credentials. """
+        return self._count
+
+    def _entry(self, position):
+        """ Return the index entry at the given position. """
+        return _ENTRY.unpack_from(self._mmap,
+                                  self._offset + position * _ENTRY.size)
+
+    def _key(self, position):
+        """ Return the key at the given position, as bytes. """
+        (key_offset, key_length, _, _) = self._entry(position)
+        return self._mmap[key_offset:key_offset + key_length]
+
+    def _find(self, key):
+        """ Return the record of the given key, as bytes, or None. """
+        key = key.encode("utf-8")
+        (low, high) = (0, self._count)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._count or self._key(low) != key:
+            return None
+        (_, _, record_offset, record_length) = self._entry(low)
+        return self._mmap[record_offset:record_offset + record_length]
+
+    def __contains__(self, key):
+        """ Return True if the key is present. """
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        """ Return the credential of the given key. """
+        record = self._find(key)
+        if record is None:
+            raise KeyError(key)
+        return parse(record.decode("utf-8"))
+
+    def get(self, key, default=None):
+        """ Return the credential of the given key or the default. """
+        record = self._find(key)
+        if record is None:
+            return default
+        return parse(record.decode("utf-8"))
+
+    def keys(self):
+        """ Iterate over the keys, in sorted order. """
+        for position in range(self._count):
+            yield self._key(position).decode("utf-8")
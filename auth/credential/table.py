@@ -0,0 +1,257 @@
+"""
+:py:meth:`CredentialTable` - columnar storage of credentials
+
+Synopsis
+========
+
+Example::
+
+  from auth.credential.table import CredentialTable
+
+  table = CredentialTable.from_strings(open("credentials.txt"))
+  for (row, code, reason) in table.validate():
+      print("row %d is invalid: %s" % (row, reason))
+  strings = table.strings()
+  cred = table.row(42)
+
+Description
+===========
+
+A credential table holds many credentials without creating one object
+per credential: the rows are grouped by scheme and each attribute of a
+scheme is stored as a column, that is a list of strings with None for
+the missing values.
+
+The checks and conversions work on whole columns at once: the scheme
+keys are looked up once per scheme, the values are compared column by
+column and each distinct value is quoted only once. Credential objects
+are only created on demand by :py:meth:`CredentialTable.row`.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.credential import new, _parse, _scheme, _VAL_CHARS
+from auth.credential.error import InvalidCredential, MISSING, CONFLICT, \
+    VALUE, UNEXPECTED
+import array
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+class _Group(object):
+    """ Columns of the rows sharing the same scheme. """
+
+    def __init__(self, scheme):
+        """ _Group constructor """
+        self.scheme = scheme
+        self.size = 0
+        self.columns = dict()
+        # distinct orders of the keys and order of each row
+        self.orders = list()
+        self._orders = dict()
+        self.order = array.array('L')
+
+    def append(self, option):
+        """ Append a row given as a dict of attributes. """
+        for key, value in option.items():
+            if key == "scheme":
+                continue
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.size
+            column.append(value)
+        self.size += 1
+        for column in self.columns.values():
+            if len(column) < self.size:
+                column.append(None)
+        order = tuple(option)
+        index = self._orders.get(order)
+        if index is None:
+            index = self._orders[order] = len(self.orders)
+            self.orders.append(order)
+        self.order.append(index)
+
+    def validate(self):
+        """
+        Check the rows against the scheme keys and return the list of
+        (position, code, reason) errors, at most one per row.
+        """
+        errors = [None] * self.size
+        option = {'scheme': self.scheme}
+        (klass, error) = _scheme(option)
+        if error is not None:
+            return [(position, error[0], error[1])
+                    for position in range(self.size)]
+        keys = klass._keys
+        missing = [None] * self.size
+
+        def flag(positions, code, reason):
+            for position in positions:
+                if errors[position] is None:
+                    errors[position] = (code, reason)
+
+        for key, value in keys.items():
+            if key == "scheme":
+                match = value.get('match', None)
+                if match is not None and option['scheme'] != match:
+                    flag(range(self.size), VALUE,
+                         "invalid value for: %s" % key)
+                continue
+            column = self.columns.get(key, missing)
+            alternative = value.get("alternative", None)
+            other = self.columns.get(alternative, missing)
+            if not value.get("optional", False):
+                flag([position for position, item in enumerate(column)
+                      if item is None and other[position] is None],
+                     MISSING, "attribute missing: %s" % key)
+            if alternative is not None:
+                flag([position for position, item in enumerate(column)
+                      if item is not None and other[position] is not None],
+                     CONFLICT, "conflicting attributes: %s, %s"
+                     % (key, alternative))
+            match = value.get('match', None)
+            if match is not None:
+                flag([position for position, item in enumerate(column)
+                      if item is not None and item != match],
+                     VALUE, "invalid value for: %s" % key)
+        # the first unexpected key in the order of each row
+        unexpected = list()
+        for order in self.orders:
+            names = [key for key in order if key not in keys]
+            if names:
+                unexpected.append((UNEXPECTED,
+                                   "attribute not expected: %s" % names[0]))
+            else:
+                unexpected.append(None)
+        for position, index in enumerate(self.order):
+            if errors[position] is None:
+                errors[position] = unexpected[index]
+        return [(position, error[0], error[1])
+                for position, error in enumerate(errors)
+                if error is not None]
+
+    def strings(self):
+        """ Return the string representation of all the rows. """
+        parts = [[self.scheme] * self.size]
+        for key, column in self.columns.items():
+            quoted = dict()
+            part = list()
+            for value in column:
+                if value is None:
+                    part.append(None)
+                    continue
+                item = quoted.get(value)
+                if item is None:
+                    item = quoted[value] = \
+                        "%s=%s" % (key, quote(value, _VAL_CHARS))
+                part.append(item)
+            parts.append(part)
+        return [' '.join([item for item in row if item is not None])
+                for row in zip(*parts)]
+
+    def option(self, position):
+        """ Return the attributes of the given row. """
+        option = {'scheme': self.scheme}
+        for key, column in self.columns.items():
+            if column[position] is not None:
+                option[key] = column[position]
+        return option
+
+
+class CredentialTable(object):
+    """
+    Table of credentials stored by column.
+    """
+
+    def __init__(self):
+        """ CredentialTable constructor """
+        self._groups = list()
+        self._index = dict()
+        # group and position in the group of each row
+        self._group = array.array('H')
+        self._position = array.array('L')
+
+    @classmethod
+    def from_dicts(cls, options):
+        """ Create a table from structured representations. """
+        table = cls()
+        for option in options:
+            table.append(option)
+        return table
+
+    @classmethod
+    def from_strings(cls, strings):
+        """ Create a table from string representations. """
+        table = cls()
+        for string in strings:
+            table.append_string(string)
+        return table
+
+    def __len__(self):
+        """ Return the number of rows. """
+        return len(self._group)
+
+    def append(self, option):
+        """ Append a row given as a structured representation. """
+        scheme = option.get("scheme", "none")
+        index = self._index.get(scheme)
+        if index is None:
+            index = self._index[scheme] = len(self._groups)
+            self._groups.append(_Group(scheme))
+        group = self._groups[index]
+        self._group.append(index)
+        self._position.append(group.size)
+        group.append(option)
+
+    def append_string(self, string):
+        """ Append a row given as a string representation. """
+        (option, error) = _parse(string)
+        if error is not None:
+            raise InvalidCredential(error[1])
+        self.append(option)
+
+    def schemes(self):
+        """ Return the schemes present in the table. """
+        return [group.scheme for group in self._groups]
+
+    def column(self, scheme, key):
+        """
+        Return the values of an attribute for the rows of the given
+        scheme, None meaning absent.
+        """
+        group = self._groups[self._index[scheme]]
+        return list(group.columns.get(key, [None] * group.size))
+
+    def validate(self):
+        """
+        Check all the rows and return the list of (row, code, reason)
+        errors, sorted by row, with the same codes and reasons as
+        auth.credential.try_new().
+        """
+        rows = dict()
+        for index, group in enumerate(self._groups):
+            rows[index] = [0] * group.size
+        for row, index in enumerate(self._group):
+            rows[index][self._position[row]] = row
+        errors = list()
+        for index, group in enumerate(self._groups):
+            errors.extend([(rows[index][position], code, reason)
+                           for (position, code, reason) in group.validate()])
+        errors.sort()
+        return errors
+
+    def strings(self):
+        """ Return the string representation of all the rows. """
+        strings = [group.strings() for group in self._groups]
+        return [strings[index][position]
+                for (index, position) in zip(self._group, self._position)]
+
+    def dict(self, row):
+        """ Return the structured representation of the given row. """
+        return self._groups[self._group[row]].option(self._position[row])
+
+    def row(self, row):
+        """ Return the Credential object of the given row. """
+        return new(**self.dict(row))
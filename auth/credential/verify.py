@@ -0,0 +1,191 @@
+"""
+:py:meth:`Verifier` - server-side verification of credentials
+
+Synopsis
+========
+
+Example::
+
+  from auth.credential.verify import Verifier, hash_password
+
+  # the store maps user names to password hashes
+  store = {'system': hash_password('manager')}
+  verifier = Verifier(store)
+
+  # decode and check the received Authorization header
+  cred = verifier.verify_header(headers['Authorization'])
+  if cred is None:
+      print("access denied")
+  else:
+      print("user name is %s" % cred.name)
+
+Description
+===========
+
+This module is the counterpart of the *HTTP.Basic* preparator: it
+decodes HTTP Basic Authorization headers back into *plain* credentials
+and verifies them against a store of password hashes.
+
+The store can be any object with a get() method (for instance a dict)
+returning the stored hash of a user name or None. By default, hashes
+are the PBKDF2 strings produced by :py:meth:`hash_password` but any
+other hashing scheme can be used by giving the verifier a different
+check function, together with a dummy hash in the same scheme. The
+dummy hash is checked for unknown users so that they take as long as
+the known ones and user names cannot be guessed by timing.
+
+Since checking a password hash is slow by design, the verifier
+remembers the recent successful verifications for a limited time. The
+cache is keyed by a digest computed with a random per-verifier key so
+it never holds the clear text passwords.
+
+Copyright (C) CERN 2013-2021
+"""
+
+from auth.credential.error import InvalidCredential
+from auth.credential.modules.plain import Plain
+import base64
+import binascii
+import collections
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+PBKDF2_PREFIX = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 100000
+
+
+def decode_http_basic(header):
+    """
+    Decode an HTTP Basic Authorization header and return the
+    corresponding Plain credential.
+    """
+    if not isinstance(header, str):
+        # typically a missing header
+        raise InvalidCredential("invalid authorization header")
+    try:
+        (kind, value) = header.strip().split(None, 1)
+    except ValueError:
+        raise InvalidCredential("invalid authorization header")
+    if kind.lower() != "basic":
+        raise InvalidCredential("unsupported authorization: %s" % kind)
+    try:
+        value = base64.b64decode(value.strip().encode(), validate=True)
+        (name, password) = value.decode("utf-8").split(":", 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCredential("invalid authorization header")
+    return Plain(name=name, **{'pass': password})
+
+
+def hash_password(password, salt=None, iterations=PBKDF2_ITERATIONS):
+    """ Return the PBKDF2 hash of the password, as a string. """
+    if salt is None:
+        salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                 salt, iterations)
+    return "%s$%d$%s$%s" % (PBKDF2_PREFIX, iterations,
+                            base64.b64encode(salt).decode(),
+                            base64.b64encode(digest).decode())
+
+
+def check_password(password, stored):
+    """ Check in constant time if the password matches the stored hash. """
+    try:
+        (prefix, iterations, salt, expected) = stored.split("$")
+        if prefix != PBKDF2_PREFIX:
+            return False
+        salt = base64.b64decode(salt)
+        expected = base64.b64decode(expected)
+        iterations = int(iterations)
+    except (binascii.Error, ValueError):
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                 salt, iterations)
+    return hmac.compare_digest(digest, expected)
+
+
+class Verifier(object):
+    """
+    Verify plain credentials against a store of password hashes,
+    remembering up to size successful verifications for ttl seconds.
+    """
+
+    def __init__(self, store, check=check_password, ttl=300, size=1024,
+                 dummy=None):
+        """ Verifier constructor """
+        self._store = store
+        self._check = check
+        if dummy is None:
+            dummy = hash_password(base64.b64encode(os.urandom(16)).decode())
+        self._dummy = dummy
+        self._ttl = ttl
+        self._size = size
+        self._key = os.urandom(32)
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, name, password, stored):
+        """ Return the cache key of the given verification. """
+        data = "\0".join([name, password, stored]).encode("utf-8")
+        return hmac.new(self._key, data, hashlib.sha256).digest()
+
+    def _cached(self, digest):
+        """ Check if the given verification is in the cache. """
+        with self._lock:
+            expiry = self._cache.get(digest)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._cache[digest]
+                return False
+            self._cache.move_to_end(digest)
+            return True
+
+    def _remember(self, digest):
+        """ Add the given verification to the cache. """
+        with self._lock:
+            self._cache[digest] = time.monotonic() + self._ttl
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self._size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        """ Forget all the cached verifications. """
+        with self._lock:
+            self._cache.clear()
+
+    def verify(self, cred):
+        """ Check if the given plain credential is valid. """
+        if cred.scheme != "plain":
+            raise InvalidCredential("credential type not supported: %s"
+                                    % cred.scheme)
+        stored = self._store.get(cred.name)
+        if stored is None:
+            # same cost as for known users
+            self._check(cred.resolve('pass'), self._dummy)
+            return False
+        password = cred.resolve('pass')
+        digest = self._digest(cred.name, password, stored)
+        if self._size > 0 and self._cached(digest):
+            return True
+        if not self._check(password, stored):
+            return False
+        if self._size > 0:
+            self._remember(digest)
+        return True
+
+    def verify_header(self, header):
+        """
+        Decode and verify an HTTP Basic Authorization header, return the
+        corresponding Plain credential if valid or None otherwise,
+        including when the header is malformed.
+        """
+        try:
+            cred = decode_http_basic(header)
+        except InvalidCredential:
+            return None
+        if self.verify(cred):
+            return cred
+        return None
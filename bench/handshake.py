@@ -0,0 +1,314 @@
+#! /usr/bin/python
+"""
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+
+ End-to-end authentication handshake benchmark.
+
+ This starts local stand-in servers (HTTP with Basic authentication,
+ STOMP with login/passcode and STOMP over TLS with client certificates,
+ using test certificates generated with the openssl command) and drives
+ many concurrent authenticated connections through the HTTP.Basic,
+ stomppy.plain and stomppy.x509 preparators. For each target, it reports
+ the handshake latency percentiles and the throughput.
+
+ Usage: python bench/handshake.py [--connections N] [--concurrency N]
+                                  [--target TARGET]...
+
+ Copyright (C) CERN 2013-2021
+"""
+
+import argparse
+import base64
+import concurrent.futures
+import os
+import shutil
+import socket
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+try:
+    from http.client import HTTPConnection
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    sys.exit("this benchmark requires Python 3.7 or later")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import auth.credential as credential  # noqa: E402
+
+USER = "bench"
+PASSWORD = "bench-password"
+TARGETS = ("HTTP.Basic", "stomppy.plain", "stomppy.x509")
+
+
+def _openssl(*args):
+    """ Run the openssl command. """
+    subprocess.check_call(("openssl", ) + args, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+
+def generate_certificates(path):
+    """
+    Generate a test CA, a server certificate for localhost and a client
+    certificate in the given directory.
+    """
+    ec_key = ("-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:P-256",
+              "-nodes")
+    ca_pem = os.path.join(path, "ca.pem")
+    ca_key = os.path.join(path, "ca.key")
+    _openssl("req", "-x509", *ec_key, "-keyout", ca_key, "-out", ca_pem,
+             "-subj", "/CN=bench-ca", "-days", "1")
+    extensions = os.path.join(path, "server.ext")
+    with open(extensions, "w") as handle:
+        handle.write("subjectAltName=DNS:localhost,IP:127.0.0.1\n")
+    for name in ("server", "client"):
+        key = os.path.join(path, "%s.key" % name)
+        csr = os.path.join(path, "%s.csr" % name)
+        _openssl("req", "-new", *ec_key, "-keyout", key, "-out", csr,
+                 "-subj", "/CN=bench-%s" % name)
+        options = ("-extfile", extensions) if name == "server" else ()
+        _openssl("x509", "-req", "-in", csr, "-CA", ca_pem, "-CAkey", ca_key,
+                 "-CAcreateserial", "-days", "1",
+                 "-out", os.path.join(path, "%s.pem" % name), *options)
+    return ca_pem
+
+
+#
+# stand-in servers
+#
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """ HTTP handler checking the Basic authentication. """
+    protocol_version = "HTTP/1.0"
+    expected = "Basic " + base64.b64encode(
+        ("%s:%s" % (USER, PASSWORD)).encode()).decode()
+
+    def do_GET(self):
+        """ Handle a GET request. """
+        if self.headers.get("Authorization") == self.expected:
+            self.send_response(200)
+        else:
+            self.send_response(401)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        """ Do not log. """
+        pass
+
+
+def _read_frame(sock):
+    """ Read a STOMP frame and return its command and headers. """
+    data = b""
+    while not data.endswith(b"\0"):
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    lines = data.rstrip(b"\0").decode().split("\n")
+    headers = dict()
+    for line in lines[1:]:
+        if not line:
+            break
+        (key, value) = line.split(":", 1)
+        headers[key] = value
+    return (lines[0], headers)
+
+
+def _frame(command, headers):
+    """ Return a STOMP frame. """
+    lines = [command] + ["%s:%s" % item for item in headers.items()]
+    return ("\n".join(lines) + "\n\n\0").encode()
+
+
+class _STOMPHandler(socketserver.BaseRequestHandler):
+    """ STOMP handler checking the login/passcode or the certificate. """
+
+    def handle(self):
+        """ Handle a connection. """
+        sock = self.request
+        context = self.server.context
+        if context is not None:
+            sock = context.wrap_socket(sock, server_side=True)
+            authenticated = sock.getpeercert() is not None
+        (command, headers) = _read_frame(sock)
+        if context is None:
+            authenticated = headers.get("login") == USER and \
+                headers.get("passcode") == PASSWORD
+        if command == "CONNECT" and authenticated:
+            sock.sendall(_frame("CONNECTED", {"version": "1.2"}))
+        else:
+            sock.sendall(_frame("ERROR", {"message": "access denied"}))
+        sock.close()
+
+
+class _STOMPServer(socketserver.ThreadingTCPServer):
+    """ Threaded STOMP server, optionally over TLS. """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address, context=None):
+        """ _STOMPServer constructor """
+        self.context = context
+        socketserver.ThreadingTCPServer.__init__(self, address, _STOMPHandler)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """ Threaded HTTP server. """
+    request_queue_size = 1024
+
+
+def _start(server):
+    """ Serve in a background thread and return the server port. """
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server.server_address[1]
+
+
+#
+# clients
+#
+
+def _stomp_connect(sock, params):
+    """ Send a STOMP CONNECT frame and check the answer. """
+    headers = {"accept-version": "1.2", "host": "localhost"}
+    if params.get("user"):
+        headers["login"] = params["user"]
+    if params.get("passcode"):
+        headers["passcode"] = params["passcode"]
+    sock.sendall(_frame("CONNECT", headers))
+    (command, _) = _read_frame(sock)
+    sock.close()
+    return command == "CONNECTED"
+
+
+def _connect_http(cred, port):
+    """ Authenticate an HTTP request. """
+    headers = {"Authorization": cred.prepare("HTTP.Basic")}
+    conn = HTTPConnection("127.0.0.1", port)
+    conn.request("GET", "/", headers=headers)
+    status = conn.getresponse().status
+    conn.close()
+    return status == 200
+
+
+def _connect_stomp(cred, port):
+    """ Authenticate a STOMP connection. """
+    params = cred.prepare("stomppy.plain")
+    return _stomp_connect(socket.create_connection(("127.0.0.1", port)),
+                          params)
+
+
+def _connect_stomp_ssl(cred, port):
+    """ Authenticate a STOMP connection over TLS. """
+    params = cred.prepare("stomppy.x509")
+    context = ssl.create_default_context(cafile=params.get("ssl_ca_certs"))
+    context.load_cert_chain(params["ssl_cert_file"], params["ssl_key_file"])
+    sock = context.wrap_socket(socket.create_connection(("127.0.0.1", port)),
+                               server_hostname="localhost")
+    return _stomp_connect(sock, params)
+
+
+#
+# benchmark
+#
+
+def percentile(values, fraction):
+    """ Return the given percentile of sorted values. """
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def run(connect, cred, port, connections, concurrency):
+    """
+    Run the given number of handshakes with the given concurrency and
+    return the sorted latencies, the elapsed time and the failures.
+    """
+    def once(_):
+        start = time.perf_counter()
+        success = connect(cred, port)
+        return (time.perf_counter() - start, success)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(once, range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted([latency for (latency, _) in results])
+    failures = len([success for (_, success) in results if not success])
+    return (latencies, elapsed, failures)
+
+
+def main():
+    """ Run the benchmark. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--connections", type=int, default=2000,
+                        help="number of handshakes per target")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="number of concurrent clients")
+    parser.add_argument("--target", action="append", choices=TARGETS,
+                        help="target to benchmark (default: all)")
+    args = parser.parse_args()
+    path = tempfile.mkdtemp()
+    try:
+        ca_pem = generate_certificates(path)
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH,
+                                                    cafile=ca_pem)
+        server_context.verify_mode = ssl.CERT_REQUIRED
+        server_context.load_cert_chain(os.path.join(path, "server.pem"),
+                                       os.path.join(path, "server.key"))
+        address = ("127.0.0.1", 0)
+        plain = credential.new(scheme="plain", name=USER,
+                               **{"pass": PASSWORD})
+        x509 = credential.new(scheme="x509", ca=ca_pem,
+                              cert=os.path.join(path, "client.pem"),
+                              key=os.path.join(path, "client.key"))
+        setup = {
+            "HTTP.Basic": (_connect_http, plain,
+                           lambda: _HTTPServer(address, _HTTPHandler)),
+            "stomppy.plain": (_connect_stomp, plain,
+                              lambda: _STOMPServer(address)),
+            "stomppy.x509": (_connect_stomp_ssl, x509,
+                             lambda: _STOMPServer(address, server_context)),
+        }
+        print("%-14s %8s %8s %8s %8s %8s %10s" %
+              ("target", "conns", "fail", "p50 ms", "p90 ms", "p99 ms",
+               "conn/s"))
+        for target in args.target or TARGETS:
+            (connect, cred, factory) = setup[target]
+            server = factory()
+            port = _start(server)
+            (latencies, elapsed, failures) = run(
+                connect, cred, port, args.connections, args.concurrency)
+            server.shutdown()
+            server.server_close()
+            print("%-14s %8d %8d %8.2f %8.2f %8.2f %10.1f" %
+                  (target, len(latencies), failures,
+                   percentile(latencies, 0.50) * 1000,
+                   percentile(latencies, 0.90) * 1000,
+                   percentile(latencies, 0.99) * 1000,
+                   len(latencies) / elapsed))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
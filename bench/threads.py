@@ -0,0 +1,127 @@
+#! /usr/bin/python
+"""
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+
+ Multi-threaded scaling benchmark.
+
+ This runs the parse(), new() and prepare() hot paths in an increasing
+ number of threads and reports the aggregated throughput and the speedup
+ compared to a single thread. On a free-threaded (no-GIL) Python build,
+ the throughput should grow almost linearly up to the number of cores.
+
+ Usage: python bench/threads.py [--operations N] [--threads N]...
+
+ Copyright (C) CERN 2013-2021
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import auth.credential as credential  # noqa: E402
+
+STRING = "plain name=system pass=manager"
+OPTION = {'scheme': 'x509', 'cert': '/path/to/cert', 'key': '/path/to/key'}
+
+
+def _parse(count):
+    """ Parse the same string repeatedly. """
+    for _ in range(count):
+        credential.parse(STRING)
+
+
+def _new(count):
+    """ Create the same credential repeatedly. """
+    for _ in range(count):
+        credential.new(**OPTION)
+
+
+def _prepare_basic(count):
+    """ Prepare the HTTP.Basic target of a shared frozen credential. """
+    cred = SHARED
+    for _ in range(count):
+        cred.prepare("HTTP.Basic")
+
+
+def _prepare_sigv4(count):
+    """ Sign requests with an hmac credential. """
+    cred = credential.new(scheme='hmac', access='AKID', secret='secret',
+                          region='us-east-1', service='s3')
+    for _ in range(count):
+        cred.sign("GET", "https://localhost/bucket/key")
+
+
+SHARED = credential.parse(STRING).freeze()
+WORKLOADS = (("parse", _parse), ("new", _new),
+             ("prepare.basic", _prepare_basic),
+             ("prepare.sigv4", _prepare_sigv4))
+
+
+def run(function, threads, count):
+    """ Run the function in the given number of threads, return ops/s. """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        function(count)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * count / (time.perf_counter() - start)
+
+
+def main():
+    """ Run the benchmark. """
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--operations", type=int, default=20000,
+                        help="number of operations per thread")
+    parser.add_argument("--threads", type=int, action="append",
+                        help="number of threads (default: powers of two up "
+                        "to the number of cores)")
+    args = parser.parse_args()
+    counts = args.threads
+    if not counts:
+        counts = [1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cpus:
+            counts.append(cpus)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("python %s, %d cores, GIL %s" %
+          (sys.version.split()[0], cpus, "enabled" if gil else "disabled"))
+    print("%-14s %8s %12s %8s" % ("workload", "threads", "ops/s", "speedup"))
+    for (name, function) in WORKLOADS:
+        # warm up the caches
+        function(100)
+        single = None
+        for threads in counts:
+            rate = run(function, threads, args.operations)
+            if single is None:
+                single = rate / threads
+            print("%-14s %8d %12.0f %8.2f" %
+                  (name, threads, rate, rate / single))
+
+
+if __name__ == "__main__":
+    main()
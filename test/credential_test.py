@@ -17,6 +17,13 @@ Copyright (C) CERN 2013-2021
 
 import auth.credential as credential
 from auth.credential.error import InvalidCredential
+import auth.credential.error as error
+import auth.credential.modules.hmac as sigv4_module
+import copy
+import datetime
+import os
+import pickle
+import tempfile
 import unittest
 
 OK = True
@@ -51,6 +58,11 @@ parse_credential = [
     (OK, "none"),
     (OK, "plain name= pass=sekret"),
     (OK, "x509 pass=x%20y"),
+    (OK, "hmac access=AKID secret=a/b+c region=us-east-1 service=s3"),
+    (FAIL, "hmac access=AKID secret=a/b+c region=us-east-1"),
+    (OK, "plain name=joe passfile=/run/secrets/joe"),
+    (FAIL, "plain name=joe pass=sekret passfile=/run/secrets/joe"),
+    (OK, "x509 cert=/foo/cert.pem passfile=/run/secrets/key"),
 ]
 create_credential = [
     (OK, {'scheme': 'plain', 'name': 'user1', 'pass': 'user1pwd'}),
@@ -113,6 +125,121 @@ class AuthTest(unittest.TestCase):
                 pass
         print("...credential creation ok")
 
+    def test_try(self):
+        """ Test the non-raising functions. """
+        print("checking non-raising functions")
+        for (shouldpass, string) in parse_credential:
+            result = credential.try_parse(string)
+            self.assertEqual(bool(result), shouldpass,
+                             "unexpected result for:\n<%s>" % string)
+            if shouldpass:
+                self.assertEqual(result.credential, credential.parse(string))
+                self.assertTrue(result.credential.validate())
+            else:
+                self.assertTrue(result.code and result.reason)
+                self.assertRaises(InvalidCredential, result.unwrap)
+        for (shouldpass, cred_struct) in create_credential:
+            result = credential.try_new(**cred_struct)
+            self.assertEqual(bool(result), shouldpass,
+                             "unexpected result for:\n<%s>" % cred_struct)
+        self.assertEqual(credential.try_parse("plain name=joe").code,
+                         error.MISSING)
+        self.assertEqual(credential.try_parse("foo").code, error.SCHEME)
+        # the unsupported schemes are remembered
+        self.assertEqual(credential.credential._SCHEME_ERRORS["foo"],
+                         (error.SCHEME, "credential type not supported: foo"))
+        self.assertEqual(credential.try_parse("foo a=1").reason,
+                         "credential type not supported: foo")
+        for scheme in (["plain"], {"plain": 1}, ("a", "b"), 1, None):
+            self.assertEqual(credential.try_new(scheme=scheme).code,
+                             error.SCHEME)
+            self.assertRaises(InvalidCredential, credential.new,
+                              scheme=scheme)
+        self.assertEqual(credential.try_parse("none a=1 a=2").code,
+                         error.DUPLICATE)
+        cred = credential.parse("plain name=joe pass=sekret")
+        cred.__dict__['foo'] = 'bar'
+        result = cred.validate()
+        self.assertEqual((result.code, result.reason),
+                         (error.UNEXPECTED, "attribute not expected: foo"))
+        print("...non-raising functions ok")
+
+    def test_fingerprint(self):
+        """ Test fingerprint and hashing. """
+        print("checking fingerprint")
+        cred1 = credential.parse("plain name=joe pass=sekret")
+        cred2 = credential.new(scheme='plain', name='joe',
+                               **{'pass': 'sekret'})
+        self.assertEqual(cred1.fingerprint(), cred2.fingerprint())
+        self.assertFalse("sekret" in cred1.fingerprint())
+        self.assertNotEqual(cred1.fingerprint(),
+                            credential.parse("plain name=joe pass=x")
+                            .fingerprint())
+        self.assertRaises(TypeError, hash, cred1)
+        seen = set([cred1.freeze(), cred2.freeze()])
+        self.assertEqual(len(seen), 1)
+        self.assertTrue(cred1 == cred2)
+        self.assertFalse(cred1 != cred2)
+        self.assertFalse(cred1 == credential.parse("plain name=joe pass=x")
+                         .freeze())
+        self.assertTrue(credential.parse("plain name=joe pass=sekret")
+                        .freeze() in seen)
+        print("...fingerprint ok")
+
+    def test_copy(self):
+        """ Test copying and pickling. """
+        print("checking copy")
+        for frozen in (False, True):
+            cred = credential.parse("plain name=Aladdin pass=sekret")
+            if frozen:
+                cred.freeze()
+                hash(cred)
+                cred.prepare("HTTP.Basic")
+            copies = [copy.copy(cred), copy.deepcopy(cred)]
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                copies.append(pickle.loads(pickle.dumps(cred, protocol)))
+            for other in copies:
+                self.assertFalse(other is cred)
+                self.assertEqual(other, cred)
+                self.assertEqual(other.is_frozen(), frozen)
+                self.assertEqual(other.prepare("HTTP.Basic"),
+                                 cred.prepare("HTTP.Basic"))
+                if frozen:
+                    self.assertEqual(hash(other), hash(cred))
+        print("...copy ok")
+
+    def test_replace(self):
+        """ Test replace. """
+        print("checking replace")
+        cred = credential.parse("plain name=joe pass=sekret")
+        new = cred.replace(**{'pass': 'other'})
+        self.assertEqual(new, credential.parse("plain name=joe pass=other"))
+        self.assertEqual(cred['pass'], "sekret")
+        self.assertFalse(new.is_frozen())
+        new = cred.replace(passfile="/run/secrets/joe", **{'pass': None})
+        self.assertEqual(new.dict(), {'scheme': 'plain', 'name': 'joe',
+                                      'passfile': '/run/secrets/joe'})
+        for changes in [{'pass': None}, {'passfile': '/run/secrets/joe'},
+                        {'scheme': 'x509'}, {'cert': '/foo/cert.pem'}]:
+            self.assertRaises(InvalidCredential, cred.replace, **changes)
+        cred = credential.parse("plain name=Aladdin pass=sekret").freeze()
+        basic = cred.prepare("HTTP.Basic")
+        self.assertTrue(cred.prepare("HTTP.Basic") is basic)
+        fingerprint = cred.fingerprint()
+        new = cred.replace(name="Aladdin")
+        self.assertTrue(new.is_frozen())
+        self.assertTrue(new.prepare("HTTP.Basic") is basic)
+        self.assertTrue(new.fingerprint() is fingerprint)
+        new = cred.replace(**{'pass': 'open sesame'})
+        self.assertEqual(new.prepare("HTTP.Basic"),
+                         "Basic QWxhZGRpbjpvcGVuIHNlc2FtZQ==")
+        self.assertNotEqual(new.fingerprint(), fingerprint)
+        cred = credential.parse("x509 cert=/foo/cert.pem key=/foo/key.pem")
+        new = cred.replace(cert="/bar/cert.pem")
+        self.assertEqual(new.prepare("stomppy.x509")['ssl_cert_file'],
+                         "/bar/cert.pem")
+        print("...replace ok")
+
     def test_decoding(self):
         """ Test decoding. """
         print("checking credential decoding")
@@ -149,6 +276,73 @@ class AuthTest(unittest.TestCase):
                          "stomppy.x509 prepare failed")
         print("...prepare ok")
 
+    def test_passfile(self):
+        """ Test secrets read from files. """
+        print("checking passfile")
+        (handle, path) = tempfile.mkstemp()
+        try:
+            os.write(handle, b"open sesame\n")
+            os.close(handle)
+            cred = credential.new(scheme='plain', name='Aladdin',
+                                  passfile=path)
+            self.assertEqual(cred.prepare("HTTP.Basic"),
+                             "Basic QWxhZGRpbjpvcGVuIHNlc2FtZQ==")
+            with open(path, "w") as handle:
+                handle.write("sesame open")
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(cred.prepare("stomppy.plain")['passcode'],
+                             "sesame open")
+            self.assertTrue(cred.resolve('pass') is cred.resolve('pass'))
+        finally:
+            os.unlink(path)
+        self.assertRaises(InvalidCredential, cred.prepare, "HTTP.Basic")
+        self.assertEqual(credential.try_parse("plain name=joe").code,
+                         error.MISSING)
+        print("...passfile ok")
+
+    def test_sigv4(self):
+        """ Test HTTP.SigV4 signing. """
+        print("checking sigv4")
+        opt = {'scheme': 'hmac', 'access': 'AKIDEXAMPLE',
+               'secret': 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY',
+               'region': 'us-east-1', 'service': 'iam'}
+        cred = credential.new(**opt)
+        self.assertEqual(cred.signing_key("20120215"),
+                         bytes.fromhex("f4780e2d9f65fa895f9c67b32ce1baf0"
+                                       "b0d8a43505a000a1a9e090d414db404d"),
+                         "signing key derivation failed")
+        opt['service'] = 'service'
+        cred = credential.new(**opt)
+        sign = cred.prepare("HTTP.SigV4")
+        when = datetime.datetime(2015, 8, 30, 12, 36, 0)
+        headers = sign("GET", "https://example.amazonaws.com/",
+                       timestamp=when)
+        self.assertEqual(headers['x-amz-date'], "20150830T123600Z")
+        self.assertEqual(headers['Authorization'],
+                         "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/"
+                         "us-east-1/service/aws4_request, "
+                         "SignedHeaders=host;x-amz-date, Signature=5fa00fa3"
+                         "1553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d"
+                         "763fbf31",
+                         "HTTP.SigV4 prepare failed")
+        requests = [("PUT", "https://example.amazonaws.com/b/k%d" % i,
+                     None, b"data") for i in range(3)]
+        batch = cred.sign_many(requests, timestamp=when)
+        self.assertEqual(batch, [cred.sign(*request, timestamp=when)
+                                 for request in requests])
+        # a full cache only drops the keys of the past days
+        sigv4_module._SIGNING_KEYS.clear()
+        for index in range(sigv4_module.SIGNING_KEYS_SIZE - 1):
+            sigv4_module._signing_key("s%d" % index, "20150829", "r", "s")
+        cred.signing_key("20150830")
+        cred.signing_key("20150830")
+        cache = sigv4_module._SIGNING_KEYS
+        self.assertEqual(len(cache), sigv4_module.SIGNING_KEYS_SIZE)
+        sigv4_module._signing_key("other", "20150830", "r", "s")
+        self.assertEqual(sorted([key[1] for key in cache]),
+                         ["20150830", "20150830"])
+        print("...sigv4 ok")
+
 
 if __name__ == "__main__":
     unittest.main()
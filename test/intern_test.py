@@ -0,0 +1,66 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.intern import InternPool
+import gc
+import unittest
+
+
+class InternTest(unittest.TestCase):
+
+    def test_freeze(self):
+        """ Test frozen credentials. """
+        print("checking freeze")
+        cred = credential.parse("plain name=joe pass=sekret")
+        cred.name = "jack"
+        self.assertFalse(cred.is_frozen())
+        self.assertTrue(cred.freeze().is_frozen())
+        try:
+            cred.name = "joe"
+            self.fail("frozen credential should not be modified")
+        except InvalidCredential:
+            pass
+        cred.dict()['name'] = "joe"
+        self.assertEqual(cred.name, "jack")
+        self.assertEqual(cred.dict(),
+                         {'scheme': 'plain', 'name': 'jack', 'pass': 'sekret'})
+        print("...freeze ok")
+
+    def test_intern(self):
+        """ Test interning. """
+        print("checking intern")
+        pool = InternPool()
+        cred1 = pool.parse("plain name=joe pass=sekret")
+        cred2 = pool.new(scheme='plain', name='joe', **{'pass': 'sekret'})
+        self.assertTrue(cred1 is cred2)
+        self.assertTrue(cred1.is_frozen())
+        cred3 = pool.parse("plain name=joe pass=other")
+        self.assertFalse(cred1 is cred3)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses']),
+                         (2, 1, 2))
+        self.assertTrue(stats['saved'] > 0)
+        del cred1, cred2
+        gc.collect()
+        self.assertEqual(len(pool), 1)
+        print("...intern ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.pool import CredentialPool, LEAST_IN_USE, WEIGHTED
+import unittest
+
+
+def _creds(count):
+    """ Return the given number of plain credentials. """
+    return [credential.parse("plain name=user%d pass=secret" % index)
+            for index in range(count)]
+
+
+class PoolTest(unittest.TestCase):
+
+    def test_round_robin(self):
+        """ Test the round-robin policy and ejection. """
+        print("checking round-robin")
+        creds = _creds(3)
+        pool = CredentialPool(creds, max_failures=2, eject_time=60)
+        self.assertEqual([pool.get() for _ in range(6)], creds * 2)
+        self.assertEqual(pool.prepare("stomppy.plain")['user'], "user0")
+        pool.report_failure(creds[1])
+        self.assertFalse(pool.is_ejected(creds[1]))
+        pool.report_failure(creds[1])
+        self.assertTrue(pool.is_ejected(creds[1]))
+        self.assertFalse(creds[1] in [pool.get() for _ in range(6)])
+        for cred in creds:
+            pool.report_failure(cred)
+            pool.report_failure(cred)
+        self.assertEqual(len(set([pool.get().name for _ in range(3)])), 3)
+        self.assertRaises(InvalidCredential, pool.report_success, _creds(1)[0])
+        self.assertRaises(InvalidCredential, CredentialPool, [])
+        self.assertRaises(InvalidCredential, CredentialPool,
+                          [creds[0], creds[1], creds[0]])
+        # equal but distinct objects are fine
+        self.assertEqual(len(CredentialPool(creds + _creds(1))), 4)
+        print("...round-robin ok")
+
+    def test_least_in_use(self):
+        """ Test the least-in-use policy. """
+        print("checking least-in-use")
+        creds = _creds(3)
+        pool = CredentialPool(creds, policy=LEAST_IN_USE)
+        leased = [pool.acquire() for _ in range(3)]
+        self.assertEqual(sorted([cred.name for cred in leased]),
+                         ["user0", "user1", "user2"])
+        pool.release(creds[2])
+        self.assertTrue(pool.acquire() is creds[2])
+        with pool.lease() as cred:
+            self.assertEqual(pool.in_use(cred), 2)
+        self.assertEqual(pool.in_use(cred), 1)
+        print("...least-in-use ok")
+
+    def test_weighted(self):
+        """ Test the weighted policy. """
+        print("checking weighted")
+        creds = _creds(2)
+        pool = CredentialPool(creds, policy=WEIGHTED, weights=[3, 1])
+        names = [pool.get().name for _ in range(8)]
+        self.assertEqual(names.count("user0"), 6)
+        self.assertEqual(names.count("user1"), 2)
+        self.assertFalse("user1user1" in "".join(names))
+        # large weights cost nothing more
+        pool = CredentialPool(creds, policy=WEIGHTED,
+                              weights=[10 ** 9 + 7, 10 ** 9])
+        names = [pool.get().name for _ in range(4)]
+        self.assertEqual(sorted(names), ["user0", "user0", "user1", "user1"])
+        pool = CredentialPool(creds, policy=WEIGHTED, weights=[1.5, 0.5])
+        names = [pool.get().name for _ in range(8)]
+        self.assertEqual(names.count("user0"), 6)
+        pool.report_failure(creds[0])
+        pool.report_failure(creds[0])
+        pool.report_failure(creds[0])
+        self.assertEqual(set([pool.get().name for _ in range(4)]),
+                         set(["user1"]))
+        for weights in ([1, "2"], [1, 0], [1, None], [1, True]):
+            self.assertRaises(InvalidCredential, CredentialPool, creds,
+                              policy=WEIGHTED, weights=weights)
+        self.assertRaises(InvalidCredential, CredentialPool, creds,
+                          policy=WEIGHTED, weights=[1])
+        print("...weighted ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.sidecar import RemoteCredential, Server, \
+    SidecarClient, load
+import datetime
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+SOURCE = """joe plain name=Aladdin pass=open%20sesame
+hm hmac access=AKID secret=sekret region=us-east-1 service=s3
+{"id": "jack", "scheme": "x509", "cert": "/foo/cert.pem", "key": "/k"}
+"""
+
+
+class SidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        """ Setup the test environment. """
+        self.path = tempfile.mkdtemp()
+        source = os.path.join(self.path, "source.txt")
+        with open(source, "w") as handle:
+            handle.write(SOURCE)
+        self.socket = os.path.join(self.path, "sidecar.sock")
+        self.server = Server(self.socket, load(source, "id"))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        """ Restore the test environment. """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.path)
+
+    def test_remote(self):
+        """ Test remote credentials. """
+        print("checking sidecar")
+        cred = RemoteCredential("joe", self.socket)
+        self.assertEqual(cred.prepare("HTTP.Basic"),
+                         "Basic QWxhZGRpbjpvcGVuIHNlc2FtZQ==")
+        self.assertEqual(cred.prepare("stomppy.plain"),
+                         {'user': 'Aladdin', 'passcode': 'open sesame'})
+        self.assertEqual(cred.scheme, "plain")
+        self.assertEqual(cred['pass'], "open sesame")
+        local = credential.parse(SOURCE.splitlines()[0].split(None, 1)[1])
+        self.assertEqual(cred, local)
+        self.assertEqual(local, cred)
+        self.assertFalse(local != cred)
+        self.assertNotEqual(credential.new(scheme="none"), cred)
+        # prepared locally since it cannot be sent in JSON
+        sign = RemoteCredential("hm", self.socket).prepare("HTTP.SigV4")
+        now = datetime.datetime(2021, 1, 1)
+        self.assertEqual(sign("GET", "https://localhost/b/k", timestamp=now),
+                         credential.parse(SOURCE.splitlines()[1].split(
+                             None, 1)[1]).sign("GET", "https://localhost/b/k",
+                                               timestamp=now))
+        self.server.creds.clear()
+        # served from the cache shared by the process
+        self.assertEqual(RemoteCredential("joe", self.socket).prepare(
+            "HTTP.Basic"), "Basic QWxhZGRpbjpvcGVuIHNlc2FtZQ==")
+        cred.clear()
+        self.assertRaises(InvalidCredential, cred.prepare, "HTTP.Basic")
+        self.assertRaises(InvalidCredential, cred.credential)
+        print("...sidecar ok")
+
+    def test_errors(self):
+        """ Test sidecar errors. """
+        print("checking sidecar errors")
+        cred = RemoteCredential("jack", self.socket)
+        self.assertEqual(cred.prepare("stomppy.x509")['ssl_key_file'], "/k")
+        self.assertRaises(InvalidCredential, cred.prepare, "HTTP.Basic")
+        self.assertRaises(InvalidCredential, cred.prepare, "ssl.context")
+        self.assertRaises(InvalidCredential,
+                          RemoteCredential("nobody", self.socket).credential)
+        self.assertRaises(InvalidCredential,
+                          RemoteCredential("joe", self.path + "/x").prepare,
+                          "HTTP.Basic")
+        client = SidecarClient(self.socket)
+        for request in ({"op": "get", "key": ["jack"]},
+                        {"op": "get", "key": {"jack": 1}},
+                        {"op": 1, "key": "jack"},
+                        {"op": "prepare", "key": "jack", "target": []},
+                        {"op": "prepare", "key": "jack", "target": {}}):
+            self.assertRaises(InvalidCredential, client.request, **request)
+        # the connection is still usable
+        self.assertEqual(client.request(op="get", key="jack")["ok"], True)
+        client.close()
+        # a running sidecar or another file are left alone
+        self.assertRaises(InvalidCredential, Server, self.socket, dict())
+        other = os.path.join(self.path, "source.txt")
+        self.assertRaises(InvalidCredential, Server, other, dict())
+        self.assertTrue(os.path.exists(other))
+        print("...sidecar errors ok")
+
+    def test_broken(self):
+        """ Test sidecars which do not answer properly. """
+        print("checking broken sidecar")
+        path = os.path.join(self.path, "broken.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        # connected but never answered
+        client = SidecarClient(path, timeout=0.1)
+        self.assertRaises(InvalidCredential, client.request, op="get",
+                          key="joe")
+        self.assertTrue(client._sock is None)
+        (conn, _) = server.accept()
+        conn.close()
+        # garbage answer, the connection must not be reused
+
+        def answer():
+            (conn, _) = server.accept()
+            conn.recv(1024)
+            conn.sendall(b"\xff\xff\xff\xff")
+            conn.close()
+        thread = threading.Thread(target=answer)
+        thread.start()
+        self.assertRaises(InvalidCredential, client.request, op="get",
+                          key="joe")
+        self.assertTrue(client._sock is None)
+        thread.join()
+        server.close()
+        print("...broken sidecar ok")
+
+    def test_stale(self):
+        """ Test the replacement of a stale socket. """
+        print("checking sidecar stale socket")
+        self.server.shutdown()
+        self.server.socket.close()
+        # the socket file is still there but nobody listens
+        self.assertTrue(os.path.exists(self.socket))
+        self.server = Server(self.socket, {"joe": credential.new(
+            scheme="none").freeze()})
+        self.thread.join()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.assertEqual(SidecarClient(self.socket).credential("joe"),
+                         credential.new(scheme="none"))
+        print("...sidecar stale socket ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
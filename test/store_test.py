@@ -0,0 +1,100 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.store import Store, build, convert
+import os
+import shutil
+import tempfile
+import unittest
+
+SOURCE = """# test credentials
+joe plain name=joe pass=sekret
+{"key": "jack", "scheme": "x509", "cert": "/foo/cert.pem"}
+
+anonymous none
+"""
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        """ Setup the test environment. """
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Restore the test environment. """
+        shutil.rmtree(self.path)
+
+    def test_convert(self):
+        """ Test store conversion and lookup. """
+        print("checking store conversion")
+        source = os.path.join(self.path, "source.txt")
+        with open(source, "w") as handle:
+            handle.write(SOURCE)
+        path = os.path.join(self.path, "store.db")
+        convert(source, path)
+        with Store(path) as store:
+            self.assertEqual(len(store), 3)
+            self.assertEqual(list(store.keys()), ["anonymous", "jack", "joe"])
+            self.assertEqual(store["joe"],
+                             credential.parse("plain name=joe pass=sekret"))
+            self.assertEqual(store["jack"].cert, "/foo/cert.pem")
+            self.assertEqual(store["anonymous"].scheme, "none")
+            self.assertFalse("nobody" in store)
+            self.assertTrue(store.get("nobody") is None)
+            self.assertRaises(KeyError, store.__getitem__, "jo")
+        for bad in ("bad plain name=bad", "bad",
+                    '{"key": ["bad"], "scheme": "none"}',
+                    '{"key": 1, "scheme": "none"}',
+                    '{"key": "a", "scheme": "plain", "name": "a", "pass": 1}',
+                    '{"key": "a", "scheme": ["plain"]}'):
+            with open(source, "w") as handle:
+                handle.write(SOURCE + bad + "\n")
+            try:
+                convert(source, path)
+            except InvalidCredential as err:
+                self.assertTrue(str(err).startswith(source + ":6: "))
+            else:
+                self.fail("no error for %s" % bad)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ["source.txt", "store.db"])
+        print("...store conversion ok")
+
+    def test_build(self):
+        """ Test store building. """
+        print("checking store building")
+        path = os.path.join(self.path, "store.db")
+        entries = [("user%05d" % index,
+                    credential.new(scheme='plain', name="user%d" % index,
+                                   **{'pass': "p%d" % index}))
+                   for index in range(1000)]
+        build(path, reversed(entries))
+        with Store(path) as store:
+            for (key, cred) in entries[::37]:
+                self.assertEqual(store[key], cred)
+        self.assertRaises(InvalidCredential, build, path,
+                          entries[:2] + entries[:1])
+        with open(path, "wb") as handle:
+            handle.write(b"garbage")
+        self.assertRaises(InvalidCredential, Store, path)
+        print("...store building ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
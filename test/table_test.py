@@ -0,0 +1,95 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.table import CredentialTable
+import unittest
+
+from test.credential_test import parse_credential
+
+
+class TableTest(unittest.TestCase):
+
+    def test_table(self):
+        """ Test table validation and serialization. """
+        print("checking table")
+        strings = [string for (_, string) in parse_credential]
+        table = CredentialTable()
+        expected = list()
+        for string in strings:
+            try:
+                table.append_string(string)
+            except InvalidCredential:
+                continue
+            result = credential.try_parse(string)
+            expected.append(result)
+        errors = dict([(row, (code, reason))
+                       for (row, code, reason) in table.validate()])
+        self.assertEqual(len(table), len(expected))
+        for row, result in enumerate(expected):
+            if result:
+                self.assertFalse(row in errors, "row %d: %s" % (row, errors))
+                self.assertEqual(table.row(row), result.credential)
+                self.assertEqual(credential.parse(table.strings()[row]),
+                                 result.credential)
+            else:
+                self.assertEqual(errors[row], (result.code, result.reason))
+        print("...table ok")
+
+    def test_columns(self):
+        """ Test table columns. """
+        print("checking columns")
+        table = CredentialTable.from_dicts([
+            {'scheme': 'plain', 'name': 'joe', 'pass': 'a b'},
+            {'scheme': 'none'},
+            {'scheme': 'plain', 'name': 'jack', 'passfile': '/x'},
+        ])
+        self.assertEqual(table.schemes(), ['plain', 'none'])
+        self.assertEqual(table.column('plain', 'pass'), ['a b', None])
+        self.assertEqual(table.column('plain', 'cert'), [None, None])
+        self.assertEqual(table.strings(),
+                         ["plain name=joe pass=a%20b", "none",
+                          "plain name=jack passfile=/x"])
+        self.assertEqual(table.validate(), list())
+        self.assertEqual(table.dict(2), {'scheme': 'plain', 'name': 'jack',
+                                         'passfile': '/x'})
+        print("...columns ok")
+
+    def test_unexpected(self):
+        """ Test the reasons of rows with many unexpected attributes. """
+        print("checking unexpected attributes")
+        options = [
+            {'scheme': 'plain', 'name': 'joe', 'pass': 'x', 'a': '1'},
+            {'scheme': 'plain', 'name': 'joe', 'pass': 'x', 'b': '1',
+             'a': '1'},
+            {'scheme': 'plain', 'c': '1', 'name': 'joe', 'a': '1',
+             'pass': 'x'},
+            {'scheme': 'none', 'b': '1', 'a': '1'},
+            {'scheme': 'none', 'a': '1', 'b': '1'},
+        ]
+        table = CredentialTable.from_dicts(options)
+        errors = table.validate()
+        self.assertEqual(len(errors), len(options))
+        for (row, code, reason) in errors:
+            result = credential.try_new(**options[row])
+            self.assertEqual((code, reason), (result.code, result.reason))
+        print("...unexpected attributes ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.verify import Verifier, decode_http_basic, \
+    hash_password
+import unittest
+
+
+class VerifyTest(unittest.TestCase):
+
+    def test_decode(self):
+        """ Test HTTP Basic decoding. """
+        print("checking decoding")
+        opt = {'scheme': 'plain', 'name': 'Aladdin', 'pass': 'open:sesame'}
+        cred = credential.new(**opt)
+        self.assertEqual(decode_http_basic(cred.prepare("HTTP.Basic")),
+                         cred)
+        for header in ["", "Basic", "Digest QWxhZGRpbjpvcGVuIHNlc2FtZQ==",
+                       "Basic !!!", "Basic QWxhZGRpbg==", None,
+                       b"Basic QWxhZGRpbjpvcGVuIHNlc2FtZQ=="]:
+            self.assertRaises(InvalidCredential, decode_http_basic, header)
+        print("...decoding ok")
+
+    def test_verify(self):
+        """ Test verification and its cache. """
+        print("checking verification")
+        calls = list()
+
+        def check(password, stored):
+            calls.append(password)
+            return password == "manager"
+
+        verifier = Verifier({'system': hash_password("manager", None, 10)},
+                            check=check, size=1)
+        header = credential.new(scheme='plain', name='system',
+                                **{'pass': 'manager'}).prepare("HTTP.Basic")
+        self.assertEqual(verifier.verify_header(header).name, "system")
+        self.assertEqual(verifier.verify_header(header).name, "system")
+        self.assertEqual(len(calls), 1, "verification not cached")
+        cred = credential.parse("plain name=system pass=wrong")
+        self.assertFalse(verifier.verify(cred))
+        self.assertFalse(verifier.verify(cred))
+        self.assertEqual(len(calls), 3, "failure should not be cached")
+        cred = credential.parse("plain name=nobody pass=manager")
+        self.assertFalse(verifier.verify(cred))
+        self.assertEqual(len(calls), 4, "dummy hash not checked")
+        self.assertIsNone(verifier.verify_header("Basic !!!"))
+        self.assertIsNone(verifier.verify_header(None))
+        verifier = Verifier({'system': hash_password("manager", None, 10)})
+        self.assertTrue(verifier.verify_header(header))
+        cred = credential.parse("plain name=system pass=manage")
+        self.assertIsNone(verifier.verify_header(cred.prepare("HTTP.Basic")))
+        print("...verification ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Copyright (C) CERN 2013-2021
+"""
+
+import auth.credential as credential
+from auth.credential.error import InvalidCredential
+from auth.credential.modules.x509 import CAIndex, _der_subject, \
+    _read_certificates
+import os
+import shutil
+import tempfile
+import unittest
+
+ALPHA = b"""-----BEGIN CERTIFICATE-----
+MIIBdzCCAR2gAwIBAgIUSKgwL1Pm3smT5Ss/bGhlba4J7pEwCgYIKoZIzj0EAwIw
+EDEOMAwGA1UEAwwFYWxwaGEwIBcNMjYxMDE5MTQwOTIxWhgPMjEyNjA5MjUxNDA5
+MjFaMBAxDjAMBgNVBAMMBWFscGhhMFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAE
+1rArqp3XjKJM1IZf00SvCPjJOyvtN0bq3gMDZ7i53+VLVLdrSaAcfpbyEsSgr5RG
+Az36sIApzkK7ctJvm9dEB6NTMFEwHQYDVR0OBBYEFH5Zfgse/XYVn8eRZ4X/zYNg
+WdyXMB8GA1UdIwQYMBaAFH5Zfgse/XYVn8eRZ4X/zYNgWdyXMA8GA1UdEwEB/wQF
+MAMBAf8wCgYIKoZIzj0EAwIDSAAwRQIgXsFI7qYQiyhIcMqEOrhLAGp9INsCYIIV
+tLd1eVFkOTMCIQCHQz579ZgBdUD9EXRThO0kWhXFMjEfZHdWzFVqo/DSoQ==
+-----END CERTIFICATE-----
+"""
+BETA = b"""-----BEGIN CERTIFICATE-----
+MIIBdDCCARugAwIBAgIUcF0hBRWIfCQHd2q0PNp5Vw5ocEswCgYIKoZIzj0EAwIw
+DzENMAsGA1UEAwwEYmV0YTAgFw0yNjEwMTkxNDA5MjFaGA8yMTI2MDkyNTE0MDky
+MVowDzENMAsGA1UEAwwEYmV0YTBZMBMGByqGSM49AgEGCCqGSM49AwEHA0IABGGM
+zHIJ3ZFD2Rn10VYtFM7HM/s45Bk/A1mFSZJOLfFgnB6TRNLAAOKgpYvThPQqLeNB
+x5mWI2TugezlJeHdhrijUzBRMB0GA1UdDgQWBBQiZHV2mx9+HMQy5GEpHQgVYK3R
++jAfBgNVHSMEGDAWgBQiZHV2mx9+HMQy5GEpHQgVYK3R+jAPBgNVHRMBAf8EBTAD
+AQH/MAoGCCqGSM49BAMCA0cAMEQCIElg5wsZf6oYXNKc4NqXWdHMdMGMdg8TzhWu
+OG5Kda1BAiAcMn0afLcnZWVrMLSTwkQQouH3VDTpAvWXtRFca/jofA==
+-----END CERTIFICATE-----
+"""
+
+
+class X509Test(unittest.TestCase):
+
+    def setUp(self):
+        """ Setup the test environment. """
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Restore the test environment. """
+        shutil.rmtree(self.path)
+
+    def _write(self, name, data):
+        """ Write a file in the CA directory. """
+        path = os.path.join(self.path, name)
+        with open(path, "wb") as handle:
+            handle.write(data)
+        return path
+
+    def test_ca_index(self):
+        """ Test the CA directory index. """
+        print("checking CA index")
+        alpha = self._write("alpha.pem", ALPHA)
+        self._write("README", b"not a certificate")
+        index = CAIndex(self.path)
+        index.refresh()
+        self.assertEqual(len(index), 1)
+        der = _read_certificates(alpha)[0]
+        self.assertEqual(index.find(_der_subject(der)), [der])
+        self.assertEqual(index.cadata(), der)
+        beta = self._write("beta.pem", BETA)
+        index.refresh()
+        self.assertEqual(len(index), 2)
+        self.assertEqual(len(index.find(_der_subject(der))), 1)
+        os.unlink(alpha)
+        index.refresh()
+        self.assertEqual(index.find(_der_subject(der)), list())
+        self.assertEqual(index.cadata(), _read_certificates(beta)[0])
+        print("...CA index ok")
+
+    def test_ca_errors(self):
+        """ Test the CA directory index errors and duplicates. """
+        print("checking CA index errors")
+        alpha = self._write("alpha.pem", ALPHA)
+        os.symlink(alpha, os.path.join(self.path, "12345678.0"))
+        os.symlink(alpha, os.path.join(self.path, "12345678.1"))
+        index = CAIndex(self.path)
+        index.refresh()
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.cadata(), _read_certificates(alpha)[0])
+        unreadable = self._write("unreadable.pem", BETA)
+        os.chmod(unreadable, 0)
+        if os.geteuid() != 0:
+            index.refresh()
+            self.assertEqual(len(index), 1)
+        for path in [alpha, os.path.join(self.path, "missing")]:
+            cred = credential.new(scheme='x509', ca=path)
+            self.assertRaises(InvalidCredential, cred.prepare, "ssl.context")
+        empty = os.path.join(self.path, "empty")
+        os.mkdir(empty)
+        cred = credential.new(scheme='x509', ca=empty)
+        self.assertRaises(InvalidCredential, cred.prepare, "ssl.context")
+        print("...CA index errors ok")
+
+    def test_ssl_context(self):
+        """ Test the ssl.context preparator. """
+        print("checking ssl.context")
+        self._write("both.pem", ALPHA + BETA)
+        cred = credential.new(scheme='x509', ca=self.path)
+        self.assertTrue(cred.ca_index() is cred.ca_index())
+        context = cred.prepare("ssl.context")
+        self.assertEqual(context.cert_store_stats()['x509_ca'], 2)
+        print("...ssl.context ok")
+
+
+if __name__ == "__main__":
+    unittest.main()